@@ -3,5 +3,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# включает пул соединений в components/database.py, если задан DB_POOL
+os.environ['DJANGO_ASGI'] = 'True'
 
 application = get_asgi_application()
@@ -0,0 +1,13 @@
+# Кэш фильтров админки. Память процесса (по умолчанию) у каждого
+# процесса своя, и сброс кэша сигналами виден только в одном из них;
+# при нескольких процессах нужен общий кэш, например
+# django.core.cache.backends.db.DatabaseCache (таблица создается
+# manage.py createcachetable) или
+# django.core.cache.backends.memcached.PyMemcacheCache
+CACHES = {
+    'default': {
+        'BACKEND': (os.environ.get('CACHE_BACKEND') or
+                    'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
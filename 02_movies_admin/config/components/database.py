@@ -1,3 +1,13 @@
+# Время жизни соединения в секундах: 0 - закрывать после каждого
+# запроса, None - без ограничения
+DB_CONN_MAX_AGE = os.environ.get('DB_CONN_MAX_AGE') or '60'
+
+# Ограничение времени запроса, например 30s; по умолчанию не задано,
+# так как распространяется на все соединения, включая migrate и команды
+# загрузки с долгими UPDATE и REFRESH MATERIALIZED VIEW. Задается
+# в окружении веб-сервера, а не management-команд
+DB_STATEMENT_TIMEOUT = os.environ.get('DB_STATEMENT_TIMEOUT')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -6,8 +16,35 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
         'PORT': os.environ.get('DB_PORT', 5432),
+        'CONN_MAX_AGE': (None if DB_CONN_MAX_AGE == 'None'
+                         else int(DB_CONN_MAX_AGE)),
         'OPTIONS': {
-            'options': '-c search_path=public,content'
+            'options': '-c search_path=public,content',
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT') or 5),
+            # разорванное сетью соединение обнаруживается TCP keepalive
+            'keepalives': 1,
+            'keepalives_idle': int(os.environ.get('DB_KEEPALIVES_IDLE') or 60),
         }
     }
 }
+
+if DB_STATEMENT_TIMEOUT:
+    DATABASES['default']['OPTIONS']['options'] += (
+        f' -c statement_timeout={DB_STATEMENT_TIMEOUT}')
+
+# Проверка постоянного соединения перед обработкой запроса
+if os.environ.get('DB_HEALTH_CHECKS', False) == 'True':
+    MIDDLEWARE.insert(0, 'config.middleware.ConnectionHealthCheckMiddleware')
+
+# В ASGI постоянные соединения Django не переиспользуются между
+# запросами, поэтому вместо них используется пул соединений
+if (os.environ.get('DJANGO_ASGI') == 'True' and
+        os.environ.get('DB_POOL', False) == 'True'):
+    DATABASES['default'].update({
+        'ENGINE': 'config.pooled_postgresql',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE') or 1),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE') or 10),
+        },
+    })
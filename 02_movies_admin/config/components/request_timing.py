@@ -0,0 +1,21 @@
+# Запросы дольше порога пишутся в лог вместе с самыми долгими SQL
+REQUEST_TIMING_SLOW_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+REQUEST_TIMING_TOP_QUERIES = int(
+    os.environ.get('SLOW_REQUEST_TOP_QUERIES', 5))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'config.middleware': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
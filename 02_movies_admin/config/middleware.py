@@ -0,0 +1,93 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+log = logging.getLogger(__name__)
+
+
+class QueryCollector(object):
+    """execute_wrapper, запоминающий текст и время каждого SQL-запроса"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def top(self, limit):
+        return sorted(self.queries, key=lambda query: query[1],
+                      reverse=True)[:limit]
+
+
+class RequestTimingMiddleware(object):
+    """Число SQL-запросов, время в БД и общее время обработки запроса.
+
+    Значения добавляются в заголовок Server-Timing и пишутся одной
+    JSON-строкой в лог. Запросы дольше REQUEST_TIMING_SLOW_MS пишутся
+    с уровнем WARNING вместе с самыми долгими SQL-запросами, параметры
+    запросов в лог не попадают.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = settings.REQUEST_TIMING_SLOW_MS
+        self.top_queries = settings.REQUEST_TIMING_TOP_QUERIES
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = collector.duration * 1000
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{len(collector.queries)} queries", '
+            f'app;dur={total_ms - db_ms:.1f}, total;dur={total_ms:.1f}')
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': len(collector.queries),
+            'db_ms': round(db_ms, 1),
+            'total_ms': round(total_ms, 1),
+        }
+        if total_ms >= self.slow_ms:
+            record['top_queries'] = [
+                {'sql': sql, 'ms': round(duration * 1000, 1)}
+                for sql, duration in collector.top(self.top_queries)]
+            log.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            log.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+
+class ConnectionHealthCheckMiddleware(object):
+    """Закрытие неработающих постоянных соединений до обработки запроса.
+
+    При CONN_MAX_AGE > 0 соединение, разорванное сервером или сетью,
+    иначе обнаруживается только ошибкой первого запроса к базе.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        for connection in connections.all():
+            if (connection.connection is not None and
+                    not connection.is_usable()):
+                connection.close()
+        return self.get_response(request)
@@ -0,0 +1,57 @@
+import threading
+
+import psycopg2.extras
+from django.db.backends.postgresql import base
+from psycopg2.pool import ThreadedConnectionPool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict, conn_params):
+    """Пул соединений процесса для базы alias"""
+    with _pools_lock:
+        if alias not in _pools:
+            options = settings_dict.get('POOL', {})
+            _pools[alias] = ThreadedConnectionPool(
+                options.get('min_size', 1), options.get('max_size', 10),
+                **conn_params)
+        return _pools[alias]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Бэкенд PostgreSQL с клиентским пулом соединений.
+
+    Используется с CONN_MAX_AGE = 0: Django закрывает соединение после
+    каждого запроса, а бэкенд вместо закрытия возвращает его в пул,
+    поэтому новое подключение и передача options не выполняются.
+    """
+
+    def pool(self, conn_params=None):
+        return get_pool(self.alias, self.settings_dict,
+                        conn_params or self.get_connection_params())
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool(conn_params).getconn()
+        # как в postgresql.DatabaseWrapper.get_new_connection
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            broken = self.connection.closed
+            if not broken:
+                # незавершенная транзакция не должна попасть в пул
+                self.connection.rollback()
+            self.pool().putconn(self.connection, close=broken)
@@ -24,6 +24,11 @@ include(
     'components/database.py',
 )
 
+# Cache
+include(
+    'components/cache.py',
+)
+
 # Password validation
 include(
     'components/password_validation.py',
@@ -39,6 +44,11 @@ include(
     'components/static_media_files.py',
 )
 
+# Request timing and logging
+include(
+    'components/request_timing.py',
+)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -0,0 +1,33 @@
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+
+
+def fetch(url):
+    started = time.perf_counter()
+    with urlopen(url) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def run(url, requests, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = sorted(executor.map(fetch, [url] * requests))
+    elapsed = time.perf_counter() - started
+    return {'requests_per_s': round(requests / elapsed, 1),
+            'p50_ms': round(statistics.median(latencies) * 1000, 1),
+            'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Measure requests per second of one URL, e.g. to '
+                    'compare DB_CONN_MAX_AGE=0 with persistent connections')
+    parser.add_argument('url')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=10)
+    args = parser.parse_args()
+    print(run(args.url, args.requests, args.concurrency))
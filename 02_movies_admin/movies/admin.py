@@ -1,15 +1,53 @@
+import uuid
+
 from django.contrib import admin
+from django.contrib.postgres.search import SearchQuery
+from django.utils.translation import gettext_lazy as _
 
-from .filters import DropdownFilter, RelatedDropdownFilter
+from .changelists import KeysetChangeList
+from .filters import CachedRelatedDropdownFilter, RangeDropdownFilter
+from .forms import PrefetchedInlineFormSet
 from .models import Filmwork, Genre, GenreFilmwork, Person, PersonFilmwork
+from .paginators import ApproximateCountPaginator
+from .widgets import PrefetchedAutocompleteSelect
+
+
+class PrefetchedAutocompleteInline(admin.TabularInline):
+    """Inline с автодополнением по связанному объекту.
+
+    Связанные объекты всех строк загружаются одним запросом,
+    поэтому число запросов не зависит от числа строк.
+    """
+
+    formset = PrefetchedInlineFormSet
+    related_field = None
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            self.related_field)
 
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.prefetch_field = self.related_field
+        return formset
 
-class GenreFilmworkInline(admin.TabularInline):
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == self.related_field:
+            kwargs['widget'] = PrefetchedAutocompleteSelect(
+                db_field, self.admin_site, using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class GenreFilmworkInline(PrefetchedAutocompleteInline):
     model = GenreFilmwork
+    autocomplete_fields = ('genre',)
+    related_field = 'genre'
 
 
-class PersonFilmworkInline(admin.TabularInline):
+class PersonFilmworkInline(PrefetchedAutocompleteInline):
     model = PersonFilmwork
+    autocomplete_fields = ('person',)
+    related_field = 'person'
 
 
 @admin.register(Genre)
@@ -22,12 +60,47 @@ class GenreAdmin(admin.ModelAdmin):
 class PersonAdmin(admin.ModelAdmin):
     list_display = ('full_name',)
     search_fields = ('full_name',)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Filmwork)
 class FilmworkAdmin(admin.ModelAdmin):
     inlines = (GenreFilmworkInline, PersonFilmworkInline)
-    list_display = ('title', 'type', 'creation_date', 'rating')
-    list_filter = ('type', ('genres', RelatedDropdownFilter),
-                   ('rating', DropdownFilter), 'creation_date',)
+    list_display = ('title', 'type', 'creation_date', 'rating',
+                    'summary_genres')
+    # жанры берутся из film_work_summary одним JOIN вместо запроса
+    # к связям на каждую строку
+    list_select_related = ('summary',)
+    list_filter = ('type', ('genres', CachedRelatedDropdownFilter),
+                   ('rating', RangeDropdownFilter), 'creation_date',)
     search_fields = ('title', 'description', 'id')
+    ordering = ('-creation_date', '-id')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    @admin.display(description=_('genres'))
+    def summary_genres(self, obj):
+        # фильм, добавленный после обновления представления, без жанров
+        summary = getattr(obj, 'summary', None)
+        return ', '.join(summary.genres) if summary else ''
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по UUID или полнотекстовый поиск по search_vector.
+
+        search_fields оставлены для отображения строки поиска; вместо
+        icontains по каждому полю используется GIN-индекс search_vector.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        try:
+            return queryset.filter(id=uuid.UUID(search_term)), False
+        except ValueError:
+            pass
+        query = SearchQuery(search_term, config=Filmwork.SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query), False
@@ -0,0 +1,111 @@
+import hashlib
+
+from django.db.models import F
+from django.http import Http404, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.generic.detail import BaseDetailView
+from django.views.generic.list import BaseListView
+
+from movies.models import FilmworkSummary, FilmworkSummaryState
+from movies.paginators import ApproximateCountPaginator
+
+# Поля ответа; id - первичный ключ FilmworkSummary.film_work
+FIELDS = ('title', 'description', 'creation_date', 'rating', 'type',
+          'genres', 'actors', 'directors', 'writers')
+
+
+def catalogue_state(request):
+    """Версия и время последнего обновления film_work_summary.
+
+    Содержимое представления меняется только при обновлении, которое
+    увеличивает версию, поэтому ETag списка меняется и при удалении
+    связей, смене роли или переименовании жанра и персоны, которые не
+    меняют число фильмов и их modified. Одна строка читается на запрос,
+    а не хранится в кэше: сброс кэша процесса не виден другим процессам.
+    """
+    if not hasattr(request, '_catalogue_state'):
+        request._catalogue_state = FilmworkSummaryState.objects.values(
+            'version', 'refreshed').get()
+    return request._catalogue_state
+
+
+def make_etag(*parts):
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def list_etag(request, **kwargs):
+    state = catalogue_state(request)
+    return make_etag(state['version'], state['refreshed'],
+                     request.get_full_path())
+
+
+def list_last_modified(request, **kwargs):
+    return catalogue_state(request)['refreshed']
+
+
+def detail_state(request, pk):
+    # строка фильма нужна и для ETag, и для Last-Modified
+    if not hasattr(request, '_film_state'):
+        request._film_state = FilmworkSummary.objects.filter(
+            pk=pk).values('modified', *FIELDS, id=F('pk')).first()
+    return request._film_state
+
+
+def detail_etag(request, pk):
+    state = detail_state(request, pk)
+    return make_etag(pk, *state.values()) if state else None
+
+
+def detail_last_modified(request, pk):
+    state = detail_state(request, pk)
+    return state['modified'] if state else None
+
+
+class MoviesApiMixin(object):
+    """Фильмы с жанрами и персонами по ролям из film_work_summary"""
+
+    model = FilmworkSummary
+    http_method_names = ['get']
+
+    def get_queryset(self):
+        return FilmworkSummary.objects.values(
+            *FIELDS, id=F('pk'),
+        ).order_by('-creation_date', '-pk')
+
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse(context, **response_kwargs)
+
+
+@method_decorator(condition(list_etag, list_last_modified), name='dispatch')
+class MoviesListApi(MoviesApiMixin, BaseListView):
+    paginate_by = 50
+    paginator_class = ApproximateCountPaginator
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        paginator, page, queryset, _ = self.paginate_queryset(
+            self.object_list, self.paginate_by)
+        return {
+            'count': paginator.count,
+            'total_pages': paginator.num_pages,
+            'prev': (page.previous_page_number()
+                     if page.has_previous() else None),
+            'next': page.next_page_number() if page.has_next() else None,
+            'results': list(queryset),
+        }
+
+
+@method_decorator(condition(detail_etag, detail_last_modified),
+                  name='dispatch')
+class MoviesDetailApi(MoviesApiMixin, BaseDetailView):
+
+    def get_object(self, queryset=None):
+        # строка уже прочитана при проверке условного запроса
+        state = detail_state(self.request, self.kwargs['pk'])
+        if state is None:
+            raise Http404
+        return {key: value for key, value in state.items()
+                if key != 'modified'}
+
+    def get_context_data(self, **kwargs):
+        return kwargs['object']
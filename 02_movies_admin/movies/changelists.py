@@ -0,0 +1,81 @@
+import datetime
+import uuid
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR, ChangeList
+from django.db.models import Q
+
+# Параметр строки запроса с курсором страницы: "<sort_key>,<id>"
+CURSOR_VAR = 'after'
+
+
+class KeysetChangeList(ChangeList):
+    """Список с постраничным переходом по курсору (sort_key, id).
+
+    При сортировке по умолчанию ('-<keyset_field>', '-id') следующая
+    страница выбирается условием по последней записи предыдущей вместо
+    OFFSET, поэтому запрос идет по индексу, начинающемуся с keyset_field,
+    и страница N стоит столько же, сколько первая.
+    При сортировке по другим столбцам работает обычная пагинация.
+    """
+
+    keyset_field = 'creation_date'
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # курсор относится только к текущей странице, ссылки фильтров,
+        # сортировки и номеров страниц начинают список заново
+        remove = [*(remove or []), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    @property
+    def keyset_enabled(self):
+        return ORDER_VAR not in self.params and not self.show_all
+
+    def parse_cursor(self, value):
+        sort_key, _, pk = value.partition(',')
+        try:
+            sort_key = (datetime.date.fromisoformat(sort_key)
+                        if sort_key else None)
+            return sort_key, uuid.UUID(pk)
+        except ValueError as error:
+            raise IncorrectLookupParameters(error)
+
+    def make_cursor(self, obj):
+        sort_key = getattr(obj, self.keyset_field)
+        return f'{sort_key.isoformat() if sort_key else ""},{obj.pk}'
+
+    def after_cursor(self, sort_key, pk):
+        # при сортировке DESC PostgreSQL ставит NULL первыми
+        field = self.keyset_field
+        if sort_key is None:
+            return (Q(**{f'{field}__isnull': True, 'pk__lt': pk}) |
+                    Q(**{f'{field}__isnull': False}))
+        return (Q(**{f'{field}__lt': sort_key}) |
+                Q(**{field: sort_key, 'pk__lt': pk}))
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.cursor = self.params.get(CURSOR_VAR)
+        self.next_cursor = None
+        if not self.keyset_enabled:
+            self.cursor = None
+            return
+        if self.cursor:
+            condition = self.after_cursor(*self.parse_cursor(self.cursor))
+            self.result_list = self.queryset.filter(
+                condition)[:self.list_per_page]
+        results = list(self.result_list)
+        if len(results) == self.list_per_page:
+            self.next_cursor = self.make_cursor(results[-1])
+
+    @property
+    def next_page_url(self):
+        if self.next_cursor:
+            return self.get_query_string(
+                {CURSOR_VAR: self.next_cursor, PAGE_VAR: None})
+        return None
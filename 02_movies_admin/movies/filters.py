@@ -1,5 +1,22 @@
+import math
+
 from django.contrib.admin.filters import (AllValuesFieldListFilter,
+                                          FieldListFilter,
                                           RelatedFieldListFilter)
+from django.core.cache import cache
+from django.db.models import Max, Min
+from django.utils.translation import gettext_lazy as _
+
+# Время жизни кэша фильтров; кэш также сбрасывается сигналами при сохранении
+FILTER_CACHE_TIMEOUT = 60 * 60
+
+
+def choices_cache_key(model):
+    return f'movies:filter:choices:{model._meta.label_lower}'
+
+
+def range_cache_key(model, field_path):
+    return f'movies:filter:range:{model._meta.label_lower}:{field_path}'
 
 
 class DropdownFilter(AllValuesFieldListFilter):
@@ -8,3 +25,80 @@ class DropdownFilter(AllValuesFieldListFilter):
 
 class RelatedDropdownFilter(RelatedFieldListFilter):
     template = 'admin/dropdown_filter.html'
+
+
+class CachedRelatedDropdownFilter(RelatedDropdownFilter):
+    """Фильтр по связанной модели со списком вариантов из кэша"""
+
+    def field_choices(self, field, request, model_admin):
+        return cache.get_or_set(
+            choices_cache_key(field.related_model),
+            lambda: super(CachedRelatedDropdownFilter, self).field_choices(
+                field, request, model_admin),
+            FILTER_CACHE_TIMEOUT)
+
+
+class RangeDropdownFilter(FieldListFilter):
+    """Фильтр числового поля по диапазонам.
+
+    Диапазоны строятся по минимуму и максимуму поля из кэша, поэтому
+    вместо SELECT DISTINCT по всей таблице выполняется не более одного
+    агрегирующего запроса за время жизни кэша.
+    """
+
+    template = 'admin/dropdown_filter.html'
+    buckets = 5
+
+    def __init__(self, field, request, params, model, model_admin,
+                 field_path):
+        self.lookup_kwarg_since = f'{field_path}__gte'
+        self.lookup_kwarg_upto = f'{field_path}__lt'
+        self.lookup_val_since = params.get(self.lookup_kwarg_since)
+        self.lookup_val_upto = params.get(self.lookup_kwarg_upto)
+        super().__init__(field, request, params, model, model_admin,
+                         field_path)
+        self.ranges = self.field_ranges(model)
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg_since, self.lookup_kwarg_upto]
+
+    def has_output(self):
+        return bool(self.ranges)
+
+    def field_stats(self, model):
+        return model._default_manager.aggregate(
+            low=Min(self.field_path), high=Max(self.field_path))
+
+    def field_ranges(self, model):
+        stats = cache.get_or_set(
+            range_cache_key(model, self.field_path),
+            lambda: self.field_stats(model), FILTER_CACHE_TIMEOUT)
+        if stats['low'] is None:
+            return []
+        low, high = math.floor(stats['low']), math.ceil(stats['high'])
+        step = max(1, math.ceil((high - low) / self.buckets))
+        bounds = list(range(low, high, step)) or [low]
+        # последний диапазон открыт сверху и включает максимум
+        return [(since, since + step) for since in bounds[:-1]] + [
+            (bounds[-1], None)]
+
+    def choices(self, changelist):
+        remove = [self.lookup_kwarg_since, self.lookup_kwarg_upto]
+        yield {
+            'selected': self.lookup_val_since is None
+            and self.lookup_val_upto is None,
+            'query_string': changelist.get_query_string(remove=remove),
+            'display': _('All'),
+        }
+        for since, upto in self.ranges:
+            params = {self.lookup_kwarg_since: since}
+            if upto is not None:
+                params[self.lookup_kwarg_upto] = upto
+            yield {
+                'selected': self.lookup_val_since == str(since)
+                and self.lookup_val_upto == (
+                    None if upto is None else str(upto)),
+                'query_string': changelist.get_query_string(params, remove),
+                'display': f'{since} – {upto}' if upto is not None
+                else f'{since}+',
+            }
@@ -0,0 +1,27 @@
+from django.forms.models import BaseInlineFormSet
+
+
+class PrefetchedInlineFormSet(BaseInlineFormSet):
+    """Формсет, передающий виджетам строк подписи связанных объектов.
+
+    Подписи берутся из queryset формсета, который загружает связанные
+    объекты через select_related, поэтому число запросов не зависит
+    от числа строк.
+    """
+
+    prefetch_field = None
+
+    def _labels(self):
+        if not hasattr(self, '_prefetched_labels'):
+            field = self.prefetch_field
+            self._prefetched_labels = {
+                str(getattr(obj, f'{field}_id')): str(getattr(obj, field))
+                for obj in self.get_queryset()}
+        return self._prefetched_labels
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        widget = form.fields[self.prefetch_field].widget
+        # виджет админки обернут в RelatedFieldWidgetWrapper
+        getattr(widget, 'widget', widget).labels = self._labels()
+        return form
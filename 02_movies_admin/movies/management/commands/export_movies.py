@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from movies.management.transfer import (FORMATS, MODELS, model_fields,
+                                        write_records)
+
+
+class Command(BaseCommand):
+    help = 'Export movies catalogue to NDJSON or CSV files, one per model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Output directory')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--models', nargs='+', choices=MODELS,
+                            default=list(MODELS))
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched per server-side cursor step')
+
+    def handle(self, *args, **options):
+        directory = Path(options['directory'])
+        directory.mkdir(parents=True, exist_ok=True)
+        fmt = options['format']
+        for name in options['models']:
+            model = MODELS[name]
+            columns = [field.attname for field in model_fields(model)]
+            # iterator() читает через серверный курсор PostgreSQL,
+            # поэтому в памяти не больше chunk_size строк
+            rows = model.objects.order_by('pk').values_list(
+                *columns).iterator(chunk_size=options['chunk_size'])
+            path = directory / f'{name}.{fmt}'
+            with open(path, 'w', encoding='utf-8', newline='') as file:
+                write_records(file, fmt, columns, rows)
+            self.stdout.write(f'{name}: {path}')
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from movies.management.transfer import (FORMATS, MODELS, batches,
+                                        keep_timestamps, model_fields,
+                                        read_records, to_instance)
+from movies.models import FilmworkSummary
+from movies.signals import reset_caches
+
+
+class Command(BaseCommand):
+    help = ('Import movies catalogue from NDJSON or CSV files '
+            'written by export_movies')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory with model files')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--models', nargs='+', choices=MODELS,
+                            default=list(MODELS))
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--update', action='store_true',
+                            help='Update existing rows instead of skipping')
+
+    def handle(self, *args, **options):
+        directory = Path(options['directory'])
+        fmt = options['format']
+        # порядок MODELS, а не --models: внешние ключи схемы DDL
+        # не отложенные, и связи загружаются после таблиц, на которые
+        # они ссылаются
+        names = [name for name in MODELS if name in options['models']]
+        with transaction.atomic():
+            for name in names:
+                path = directory / f'{name}.{fmt}'
+                if not path.exists():
+                    continue
+                with open(path, encoding='utf-8', newline='') as file:
+                    count = self.import_model(
+                        MODELS[name], file, fmt, options['batch_size'],
+                        options['update'])
+                self.stdout.write(f'{name}: {count}')
+        FilmworkSummary.refresh()
+        # bulk-операции не отправляют сигналы
+        reset_caches()
+
+    def import_model(self, model, file, fmt, batch_size, update):
+        fields = model_fields(model)
+        update_fields = [field.name for field in fields
+                         if not field.primary_key]
+        count = 0
+        records = read_records(file, fmt)
+        with keep_timestamps(model):
+            for batch in batches(records, batch_size):
+                objs = [to_instance(model, fields, record, fmt)
+                        for record in batch]
+                if update:
+                    # в Django 3.2 у bulk_create нет update_conflicts:
+                    # существующие записи обновляются bulk_update
+                    existing = set(model.objects.filter(
+                        pk__in=[obj.pk for obj in objs],
+                    ).values_list('pk', flat=True))
+                    model.objects.bulk_update(
+                        [obj for obj in objs if obj.pk in existing],
+                        update_fields)
+                    objs = [obj for obj in objs if obj.pk not in existing]
+                model.objects.bulk_create(objs, ignore_conflicts=True)
+                count += len(batch)
+        return count
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from movies.models import FilmworkSummary
+from movies.signals import reset_caches
+
+
+class Command(BaseCommand):
+    help = 'Refresh the content.film_work_summary materialized view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--blocking', action='store_true',
+                            help='Refresh without CONCURRENTLY: faster, '
+                                 'but blocks reads of the view')
+        parser.add_argument('--if-dirty', action='store_true',
+                            help='Refresh only if the source tables '
+                                 'changed since the last refresh')
+        parser.add_argument('--every', type=float, metavar='SECONDS',
+                            help='Keep running and refresh the changed '
+                                 'view every SECONDS (implies --if-dirty)')
+
+    def handle(self, *args, **options):
+        if options['every'] is None:
+            self.refresh(options['blocking'], options['if_dirty'])
+            return
+        while True:
+            try:
+                self.refresh(options['blocking'], if_dirty=True)
+            except DatabaseError as error:
+                # например, таймаут ожидания транзакций загрузки
+                self.stderr.write(f'Refresh failed: {error}')
+                # следующая попытка с новым соединением
+                connection.close()
+            time.sleep(options['every'])
+
+    def refresh(self, blocking, if_dirty):
+        started = time.perf_counter()
+        if FilmworkSummary.refresh(concurrently=not blocking,
+                                   if_dirty=if_dirty):
+            reset_caches()
+            self.stdout.write(f'Refreshed in '
+                              f'{time.perf_counter() - started:.2f}s')
@@ -0,0 +1,96 @@
+import csv
+import datetime
+import json
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from movies.models import (Filmwork, Genre, GenreFilmwork, Person,
+                           PersonFilmwork)
+
+# Модели в порядке загрузки: связи после фильмов, жанров и персон
+MODELS = {
+    'genre': Genre,
+    'person': Person,
+    'film_work': Filmwork,
+    'genre_film_work': GenreFilmwork,
+    'person_film_work': PersonFilmwork,
+}
+
+FORMATS = ('ndjson', 'csv')
+
+# заполняется триггером БД
+GENERATED_FIELDS = ('search_vector',)
+
+
+class RecordEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder без округления времени до миллисекунд"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def model_fields(model):
+    return [field for field in model._meta.concrete_fields
+            if field.name not in GENERATED_FIELDS]
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def write_records(file, fmt, columns, rows):
+    """Запись строк values_list в NDJSON или CSV"""
+    if fmt == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow('' if value is None else value for value in row)
+        return
+    encoder = RecordEncoder(ensure_ascii=False)
+    for row in rows:
+        file.write(encoder.encode(dict(zip(columns, row))))
+        file.write('\n')
+
+
+def read_records(file, fmt):
+    """Словари записей из NDJSON или CSV; в CSV пустая строка - NULL"""
+    if fmt == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def to_instance(model, fields, record, fmt):
+    values = {}
+    for field in fields:
+        if field.attname not in record:
+            continue
+        value = record[field.attname]
+        if fmt == 'csv' and value == '' and field.null:
+            value = None
+        values[field.attname] = field.to_python(value)
+    return model(**values)
+
+
+@contextmanager
+def keep_timestamps(model):
+    """Отключение auto_now, чтобы bulk_create сохранил даты из файла"""
+    fields = [field for field in model_fields(model)
+              if getattr(field, 'auto_now', False) or
+              getattr(field, 'auto_now_add', False)]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
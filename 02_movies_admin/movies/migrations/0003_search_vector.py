@@ -0,0 +1,65 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:15
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE OR REPLACE FUNCTION content.film_work_search_vector_update()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER film_work_search_vector_trigger
+BEFORE INSERT OR UPDATE OF title, description ON content.film_work
+FOR EACH ROW EXECUTE FUNCTION content.film_work_search_vector_update();
+
+UPDATE content.film_work SET title = title;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS film_work_search_vector_trigger ON content.film_work;
+DROP FUNCTION IF EXISTS content.film_work_search_vector_update();
+"""
+
+# Индексы построены по UPPER(...::text), как условие lookup icontains,
+# поэтому их использует стандартный поиск админки по search_fields
+TRIGRAM_INDEXES = """
+CREATE INDEX IF NOT EXISTS person_full_name_trgm_idx
+ON content.person USING gin (UPPER(full_name::text) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS genre_name_trgm_idx
+ON content.genre USING gin (UPPER(name::text) gin_trgm_ops);
+"""
+
+DROP_TRIGRAM_INDEXES = """
+DROP INDEX IF EXISTS content.person_full_name_trgm_idx;
+DROP INDEX IF EXISTS content.genre_name_trgm_idx;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_add_certificate_and_file_path'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='filmwork',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+        migrations.AddIndex(
+            model_name='filmwork',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='film_work_search_vector_idx'),
+        ),
+        migrations.RunSQL(TRIGRAM_INDEXES, DROP_TRIGRAM_INDEXES),
+    ]
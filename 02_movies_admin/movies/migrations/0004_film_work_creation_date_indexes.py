@@ -0,0 +1,28 @@
+from django.db import migrations
+
+# Индексы из movies_database.ddl, по которым идет постраничный переход
+# по курсору в списке фильмов; в базе, созданной по DDL, они уже есть.
+# Имена длиннее 30 символов, допустимых для models.Index, поэтому
+# индексы создаются SQL, а не в Meta.indexes.
+CREATION_DATE_INDEXES = """
+CREATE INDEX IF NOT EXISTS film_work_creation_date_rating_idx
+ON content.film_work (creation_date, rating);
+CREATE INDEX IF NOT EXISTS film_work_creation_date_type_idx
+ON content.film_work (creation_date, type);
+"""
+
+DROP_CREATION_DATE_INDEXES = """
+DROP INDEX IF EXISTS content.film_work_creation_date_rating_idx;
+DROP INDEX IF EXISTS content.film_work_creation_date_type_idx;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATION_DATE_INDEXES, DROP_CREATION_DATE_INDEXES),
+    ]
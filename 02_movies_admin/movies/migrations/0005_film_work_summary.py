@@ -0,0 +1,92 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:26
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Фильм с агрегированными жанрами и персонами по ролям.
+# modified - последнее изменение фильма, жанров, персон и связей,
+# по нему API строит ETag и Last-Modified.
+# Жанры и персоны агрегируются отдельными LATERAL-подзапросами: общий
+# JOIN размножал бы каждый фильм на жанры x персоны до агрегации.
+# Персоны агрегируются по связям, а не по различным именам, поэтому
+# однофамильцы не сливаются.
+FILM_WORK_SUMMARY = """
+CREATE MATERIALIZED VIEW content.film_work_summary AS
+SELECT
+    fw.id,
+    fw.title,
+    fw.description,
+    fw.creation_date,
+    fw.rating,
+    fw.type,
+    GREATEST(fw.modified, gs.modified, gs.created,
+             ps.modified, ps.created) AS modified,
+    COALESCE(gs.genres, '{}') AS genres,
+    COALESCE(ps.actors, '{}') AS actors,
+    COALESCE(ps.directors, '{}') AS directors,
+    COALESCE(ps.writers, '{}') AS writers
+FROM content.film_work fw
+LEFT JOIN LATERAL (
+    SELECT array_agg(g.name ORDER BY g.name) AS genres,
+           max(g.modified) AS modified, max(gfw.created) AS created
+    FROM content.genre_film_work gfw
+    JOIN content.genre g ON g.id = gfw.genre_id
+    WHERE gfw.film_work_id = fw.id
+) gs ON TRUE
+LEFT JOIN LATERAL (
+    SELECT array_agg(p.full_name ORDER BY p.full_name, p.id)
+               FILTER (WHERE pfw.role = 'actor') AS actors,
+           array_agg(p.full_name ORDER BY p.full_name, p.id)
+               FILTER (WHERE pfw.role = 'director') AS directors,
+           array_agg(p.full_name ORDER BY p.full_name, p.id)
+               FILTER (WHERE pfw.role = 'writer') AS writers,
+           max(p.modified) AS modified, max(pfw.created) AS created
+    FROM content.person_film_work pfw
+    JOIN content.person p ON p.id = pfw.person_id
+    WHERE pfw.film_work_id = fw.id
+) ps ON TRUE;
+
+-- уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX film_work_summary_id_idx
+ON content.film_work_summary (id);
+CREATE INDEX film_work_summary_creation_date_idx
+ON content.film_work_summary (creation_date DESC, id DESC);
+CREATE INDEX film_work_summary_modified_idx
+ON content.film_work_summary (modified);
+"""
+
+DROP_FILM_WORK_SUMMARY = """
+DROP MATERIALIZED VIEW IF EXISTS content.film_work_summary;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_film_work_creation_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilmworkSummary',
+            fields=[
+                ('film_work', models.OneToOneField(db_column='id', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='summary', serialize=False, to='movies.filmwork', verbose_name='film work')),
+                ('title', models.TextField(verbose_name='title')),
+                ('description', models.TextField(null=True, verbose_name='description')),
+                ('creation_date', models.DateField(null=True, verbose_name='creation_date')),
+                ('rating', models.FloatField(null=True, verbose_name='rating')),
+                ('type', models.TextField(verbose_name='type')),
+                ('modified', models.DateTimeField(verbose_name='modified')),
+                ('genres', django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), size=None, verbose_name='genres')),
+                ('actors', django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), size=None)),
+                ('directors', django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), size=None)),
+                ('writers', django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), size=None)),
+            ],
+            options={
+                'db_table': 'content"."film_work_summary',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(FILM_WORK_SUMMARY, DROP_FILM_WORK_SUMMARY),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+SUMMARY_TABLES = ('film_work', 'genre', 'person', 'genre_film_work',
+                  'person_film_work')
+
+# Состояние film_work_summary: dirty ставят триггеры таблиц, из которых
+# собирается представление, version увеличивается при каждом обновлении
+# и входит в ETag списка API.
+FILM_WORK_SUMMARY_STATE = """
+CREATE TABLE content.film_work_summary_state (
+    id smallint PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    dirty boolean NOT NULL DEFAULT false,
+    version bigint NOT NULL DEFAULT 0,
+    refreshed timestamp with time zone NOT NULL DEFAULT now()
+);
+INSERT INTO content.film_work_summary_state DEFAULT VALUES;
+
+-- триггер уровня оператора: один UPDATE на оператор, а не на строку;
+-- пока флаг уже поставлен, строка состояния не изменяется
+CREATE FUNCTION content.film_work_summary_mark_dirty()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE content.film_work_summary_state SET dirty = true WHERE NOT dirty;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Сброс флага перед обновлением представления. Блокировка SHARE
+-- дожидается транзакций, уже изменивших таблицы: их флаг мог быть
+-- поставлен раньше сброса, а изменения зафиксированы позже. Ожидание
+-- ограничено, чтобы не задерживать запись; при таймауте обновление
+-- повторяется в следующий раз.
+CREATE FUNCTION content.film_work_summary_begin_refresh()
+RETURNS boolean AS $$
+DECLARE
+    was_dirty boolean;
+BEGIN
+    PERFORM set_config('lock_timeout', '500ms', true);
+    LOCK TABLE content.film_work, content.genre, content.person,
+        content.genre_film_work, content.person_film_work IN SHARE MODE;
+    SELECT dirty INTO was_dirty
+    FROM content.film_work_summary_state FOR UPDATE;
+    UPDATE content.film_work_summary_state SET dirty = false;
+    RETURN was_dirty;
+END
+$$ LANGUAGE plpgsql;
+""" + "".join(f"""
+CREATE TRIGGER film_work_summary_dirty
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON content.{table}
+FOR EACH STATEMENT EXECUTE FUNCTION content.film_work_summary_mark_dirty();
+""" for table in SUMMARY_TABLES)
+
+DROP_FILM_WORK_SUMMARY_STATE = "".join(f"""
+DROP TRIGGER IF EXISTS film_work_summary_dirty ON content.{table};
+""" for table in SUMMARY_TABLES) + """
+DROP FUNCTION IF EXISTS content.film_work_summary_begin_refresh();
+DROP FUNCTION IF EXISTS content.film_work_summary_mark_dirty();
+DROP TABLE IF EXISTS content.film_work_summary_state;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_film_work_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilmworkSummaryState',
+            fields=[
+                ('id', models.SmallIntegerField(primary_key=True, serialize=False)),
+                ('dirty', models.BooleanField()),
+                ('version', models.BigIntegerField()),
+                ('refreshed', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'content"."film_work_summary_state',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(FILM_WORK_SUMMARY_STATE,
+                          DROP_FILM_WORK_SUMMARY_STATE),
+    ]
@@ -1,7 +1,11 @@
 import uuid
 
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import DatabaseError, connection, models, transaction
+from django.db.models.functions import Now
 from django.utils.translation import gettext_lazy as _
 
 """
@@ -79,9 +83,18 @@ class Filmwork(BaseModel):
         Genre, through='GenreFilmwork', verbose_name=_('genres'))
     persons = models.ManyToManyField(
         Person, through='PersonFilmwork', verbose_name=_('persons'))
+    # заполняется триггером БД из title и description
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # конфигурация полнотекстового поиска, как в триггере search_vector
+    SEARCH_CONFIG = 'english'
 
     class Meta:
         db_table = "content\".\"film_work"
+        indexes = [
+            GinIndex(fields=['search_vector'],
+                     name='film_work_search_vector_idx'),
+        ]
         verbose_name = _('film work')
         verbose_name_plural = _('film works')
 
@@ -116,3 +129,80 @@ class PersonFilmwork(UUIDFieldMixin, models.Model):
         unique_together = [['film_work', 'person', 'role']]
         verbose_name = _('person of film')
         verbose_name_plural = _('persons of film')
+
+
+class FilmworkSummary(models.Model):
+    """Фильм с жанрами и персонами по ролям.
+
+    Материализованное представление content.film_work_summary
+    (миграция 0005) обновляется методом refresh вне запросов:
+    командой refresh_film_work_summary по расписанию, после
+    import_movies и после загрузки из SQLite. Изменения таблиц
+    отмечаются триггерами в FilmworkSummaryState (миграция 0006).
+    """
+
+    film_work = models.OneToOneField(
+        Filmwork, primary_key=True, db_column='id',
+        on_delete=models.DO_NOTHING, related_name='summary',
+        verbose_name=_('film work'))
+    title = models.TextField(_('title'))
+    description = models.TextField(_('description'), null=True)
+    creation_date = models.DateField(_('creation_date'), null=True)
+    rating = models.FloatField(_('rating'), null=True)
+    type = models.TextField(_('type'))
+    # последнее изменение фильма, его жанров, персон и связей
+    modified = models.DateTimeField(_('modified'))
+    genres = ArrayField(models.TextField(), verbose_name=_('genres'))
+    actors = ArrayField(models.TextField())
+    directors = ArrayField(models.TextField())
+    writers = ArrayField(models.TextField())
+
+    class Meta:
+        managed = False
+        db_table = "content\".\"film_work_summary"
+
+    @classmethod
+    def refresh(cls, concurrently=True, if_dirty=False):
+        """Обновление представления и версии в FilmworkSummaryState.
+
+        С if_dirty представление обновляется, только если таблицы
+        изменились после предыдущего обновления. Возвращает, было ли
+        оно обновлено.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SELECT content.film_work_summary_begin_refresh()')
+            dirty = cursor.fetchone()[0]
+        if if_dirty and not dirty:
+            return False
+        # CONCURRENTLY не блокирует чтение представления во время
+        # обновления, для этого нужен уникальный индекс по id
+        option = 'CONCURRENTLY ' if concurrently else ''
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'REFRESH MATERIALIZED VIEW {option}'
+                               f'content.film_work_summary')
+                # после REFRESH, чтобы строка состояния не была
+                # заблокирована для триггеров на все время обновления
+                FilmworkSummaryState.objects.update(
+                    version=models.F('version') + 1, refreshed=Now())
+        except DatabaseError:
+            FilmworkSummaryState.objects.update(dirty=True)
+            raise
+        return True
+
+
+class FilmworkSummaryState(models.Model):
+    """Единственная строка состояния content.film_work_summary.
+
+    dirty ставят триггеры таблиц фильмов, жанров, персон и связей,
+    version увеличивается при каждом обновлении представления.
+    """
+
+    id = models.SmallIntegerField(primary_key=True)
+    dirty = models.BooleanField()
+    version = models.BigIntegerField()
+    refreshed = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = "content\".\"film_work_summary_state"
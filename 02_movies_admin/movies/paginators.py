@@ -0,0 +1,35 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class ApproximateCountPaginator(Paginator):
+    """Пагинатор с оценкой числа записей для больших таблиц.
+
+    Для запроса без условий вместо SELECT COUNT(*) используется оценка
+    pg_class.reltuples, которую обновляют ANALYZE и autovacuum, если она
+    больше threshold. Отфильтрованные и небольшие выборки считаются точно.
+    """
+
+    threshold = 100000
+    is_approximate = False
+
+    def estimate(self):
+        queryset = self.object_list
+        table = f'"{queryset.model._meta.db_table}"'
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+        return row[0] if row else -1
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = self.estimate()
+            if estimate > self.threshold:
+                self.is_approximate = True
+                return estimate
+        return super().count
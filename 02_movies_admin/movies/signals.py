@@ -0,0 +1,22 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .filters import choices_cache_key, range_cache_key
+from .models import Filmwork, Genre
+
+
+def reset_caches():
+    """Сброс кэшей после изменений в обход сигналов, например bulk_create"""
+    cache.delete_many([choices_cache_key(Genre),
+                       range_cache_key(Filmwork, 'rating')])
+
+
+@receiver([post_save, post_delete], sender=Genre)
+def reset_genre_choices(sender, **kwargs):
+    cache.delete(choices_cache_key(Genre))
+
+
+@receiver([post_save, post_delete], sender=Filmwork)
+def reset_rating_ranges(sender, **kwargs):
+    cache.delete(range_cache_key(Filmwork, 'rating'))
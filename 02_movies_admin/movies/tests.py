@@ -1,3 +1,413 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .admin import FilmworkAdmin
+from .changelists import CURSOR_VAR
+from .filters import choices_cache_key, range_cache_key
+from .management.transfer import MODELS
+from .models import (Filmwork, FilmworkSummary, FilmworkSummaryState,
+                     Genre, GenreFilmwork, Person, PersonFilmwork)
+from .paginators import ApproximateCountPaginator
+
+
+class FilmworkAdminChangeViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_filmwork(self, cast_size):
+        filmwork = Filmwork.objects.create(
+            title=f'Film {cast_size}', creation_date='2021-01-01',
+            rating=5, type=Filmwork.Type.MOVIE)
+        genre = Genre.objects.create(name=f'Genre {cast_size}')
+        GenreFilmwork.objects.create(film_work=filmwork, genre=genre)
+        PersonFilmwork.objects.bulk_create(
+            PersonFilmwork(film_work=filmwork, role='actor',
+                           person=Person.objects.create(
+                               full_name=f'Person {cast_size}-{number}'))
+            for number in range(cast_size))
+        return filmwork
+
+    def change_view_queries(self, filmwork):
+        url = reverse('admin:movies_filmwork_change', args=(filmwork.pk,))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_depend_on_cast_size(self):
+        small_cast = self.change_view_queries(self.create_filmwork(1))
+        large_cast = self.change_view_queries(self.create_filmwork(50))
+        self.assertEqual(small_cast, large_cast)
+
+    def test_inline_renders_selected_person(self):
+        filmwork = self.create_filmwork(2)
+        response = self.client.get(
+            reverse('admin:movies_filmwork_change', args=(filmwork.pk,)))
+        self.assertContains(response, 'Person 2-0')
+        self.assertContains(response, 'Person 2-1')
+
+
+class FilmworkAdminFiltersTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def create_filmwork(self, rating):
+        return Filmwork.objects.create(
+            title=f'Film {rating}', creation_date='2021-01-01',
+            rating=rating, type=Filmwork.Type.MOVIE)
+
+    def test_rating_range_filter(self):
+        self.create_filmwork(1)
+        self.create_filmwork(9.5)
+        url = reverse('admin:movies_filmwork_changelist')
+        response = self.client.get(url, {'rating__gte': 9})
+        self.assertContains(response, 'Film 9.5')
+        self.assertNotContains(response, 'Film 1<')
+
+    def test_filter_caches_are_reset_on_save(self):
+        self.create_filmwork(1)
+        url = reverse('admin:movies_filmwork_changelist')
+        self.client.get(url)
+        self.assertIsNotNone(cache.get(range_cache_key(Filmwork, 'rating')))
+        self.assertIsNotNone(cache.get(choices_cache_key(Genre)))
+        self.create_filmwork(5)
+        Genre.objects.create(name='Drama')
+        self.assertIsNone(cache.get(range_cache_key(Filmwork, 'rating')))
+        self.assertIsNone(cache.get(choices_cache_key(Genre)))
+
+
+class FilmworkAdminSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.star_wars = Filmwork.objects.create(
+            title='Star Wars', description='A galaxy far, far away',
+            creation_date='1977-05-25', rating=8.6, type=Filmwork.Type.MOVIE)
+        cls.matrix = Filmwork.objects.create(
+            title='The Matrix', creation_date='1999-03-31', rating=8.7,
+            type=Filmwork.Type.MOVIE)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def search(self, term):
+        response = self.client.get(
+            reverse('admin:movies_filmwork_changelist'), {'q': term})
+        return list(response.context['cl'].result_list)
+
+    def test_full_text_search(self):
+        self.assertEqual(self.search('galaxies'), [self.star_wars])
+
+    def test_search_by_uuid(self):
+        self.assertEqual(self.search(str(self.matrix.id)), [self.matrix])
+
+
+class ApproximateCountPaginatorTest(TestCase):
+
+    def test_small_table_is_counted_exactly(self):
+        Person.objects.create(full_name='Person')
+        paginator = ApproximateCountPaginator(
+            Person.objects.order_by('full_name'), 10)
+        self.assertIsInstance(paginator.estimate(), int)
+        self.assertEqual(paginator.count, 1)
+        self.assertFalse(paginator.is_approximate)
+
+    def test_large_table_uses_estimate(self):
+        paginator = ApproximateCountPaginator(
+            Person.objects.order_by('full_name'), 10)
+        paginator.threshold = 100
+        paginator.estimate = lambda: 1000
+        self.assertEqual(paginator.count, 1000)
+        self.assertTrue(paginator.is_approximate)
+
+    def test_filtered_queryset_is_counted_exactly(self):
+        paginator = ApproximateCountPaginator(
+            Person.objects.filter(full_name='Person').order_by('id'), 10)
+        paginator.threshold = 100
+        paginator.estimate = lambda: 1000
+        self.assertEqual(paginator.count, 0)
+        self.assertFalse(paginator.is_approximate)
+
+
+class FilmworkAdminKeysetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        Filmwork.objects.bulk_create(
+            Filmwork(title=f'Film {number}',
+                     creation_date=f'2021-01-{number % 3 + 1:02}',
+                     rating=5, type=Filmwork.Type.MOVIE)
+            for number in range(7))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def changelist(self, params=None):
+        response = self.client.get(
+            reverse('admin:movies_filmwork_changelist'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    @mock.patch.object(FilmworkAdmin, 'list_per_page', 3)
+    def test_cursor_pages_cover_all_rows_in_order(self):
+        expected = list(Filmwork.objects.order_by('-creation_date', '-id'))
+        pages, params = [], {}
+        while True:
+            cl = self.changelist(params)
+            pages.extend(cl.result_list)
+            if not cl.next_cursor:
+                break
+            params = {CURSOR_VAR: cl.next_cursor}
+        self.assertEqual(pages, expected)
+
+    def test_cursor_query_has_no_offset(self):
+        filmwork = Filmwork.objects.order_by('-creation_date', '-id')[0]
+        cursor = f'{filmwork.creation_date},{filmwork.id}'
+        with CaptureQueriesContext(connection) as context:
+            self.changelist({CURSOR_VAR: cursor})
+        self.assertFalse(any('OFFSET' in query['sql']
+                             for query in context.captured_queries))
+
+    def test_invalid_cursor(self):
+        url = reverse('admin:movies_filmwork_changelist')
+        response = self.client.get(url, {CURSOR_VAR: 'x'})
+        self.assertRedirects(response, f'{url}?e=1',
+                             fetch_redirect_response=False)
+
+
+class MoviesApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.filmwork = Filmwork.objects.create(
+            title='Star Wars', creation_date='1977-05-25', rating=8.6,
+            type=Filmwork.Type.MOVIE)
+        genre = Genre.objects.create(name='Sci-Fi')
+        GenreFilmwork.objects.create(film_work=cls.filmwork, genre=genre)
+        for name, role in (('Mark Hamill', 'actor'),
+                           ('Harrison Ford', 'actor'),
+                           ('George Lucas', 'director'),
+                           ('George Lucas', 'writer')):
+            person, _ = Person.objects.get_or_create(full_name=name)
+            PersonFilmwork.objects.create(
+                film_work=cls.filmwork, person=person, role=role)
+        FilmworkSummary.refresh()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list_groups_persons_by_role(self):
+        response = self.client.get('/api/v1/movies/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        movie = data['results'][0]
+        self.assertEqual(movie['genres'], ['Sci-Fi'])
+        self.assertEqual(movie['actors'], ['Harrison Ford', 'Mark Hamill'])
+        self.assertEqual(movie['directors'], ['George Lucas'])
+        self.assertEqual(movie['writers'], ['George Lucas'])
+
+    def test_list_query_count_does_not_depend_on_films(self):
+        def list_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                self.client.get('/api/v1/movies/')
+            return len(context.captured_queries)
+        before = list_queries()
+        Filmwork.objects.bulk_create(
+            Filmwork(title=f'Film {number}', creation_date='2021-01-01',
+                     rating=5, type=Filmwork.Type.MOVIE)
+            for number in range(10))
+        FilmworkSummary.refresh()
+        self.assertEqual(list_queries(), before)
+        self.assertEqual(self.client.get('/api/v1/movies/').json()['count'],
+                         11)
+
+    def test_detail(self):
+        response = self.client.get(f'/api/v1/movies/{self.filmwork.id}/')
+        self.assertEqual(response.json()['title'], 'Star Wars')
+        response = self.client.get(f'/api/v1/movies/{uuid.uuid4()}/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_conditional_requests(self):
+        for url in ('/api/v1/movies/', f'/api/v1/movies/{self.filmwork.id}/'):
+            etag = self.client.get(url)['ETag']
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertLessEqual(len(context.captured_queries), 1)
+
+    def test_etag_changes_on_save(self):
+        etag = self.client.get('/api/v1/movies/')['ETag']
+        Genre.objects.filter(name='Sci-Fi').get().save()
+        call_command('refresh_film_work_summary', '--if-dirty',
+                     stdout=io.StringIO())
+        response = self.client.get('/api/v1/movies/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_etag_changes_when_link_removed(self):
+        etag = self.client.get('/api/v1/movies/')['ETag']
+        PersonFilmwork.objects.filter(person__full_name='Mark Hamill').delete()
+        call_command('refresh_film_work_summary', '--if-dirty',
+                     stdout=io.StringIO())
+        response = self.client.get('/api/v1/movies/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['actors'],
+                         ['Harrison Ford'])
+
+    def test_namesakes_are_different_persons(self):
+        namesake = Person.objects.create(full_name='Harrison Ford')
+        PersonFilmwork.objects.create(
+            film_work=self.filmwork, person=namesake, role='actor')
+        FilmworkSummary.refresh()
+        response = self.client.get(f'/api/v1/movies/{self.filmwork.id}/')
+        self.assertEqual(response.json()['actors'],
+                         ['Harrison Ford', 'Harrison Ford', 'Mark Hamill'])
+
+
+class FilmworkSummaryRefreshTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.genre = Genre.objects.create(name='Sci-Fi')
+        FilmworkSummary.refresh()
+
+    def state(self):
+        return FilmworkSummaryState.objects.get()
+
+    def test_changes_mark_summary_dirty(self):
+        self.assertFalse(self.state().dirty)
+        Person.objects.create(full_name='Mark Hamill')
+        self.assertTrue(self.state().dirty)
+
+    def test_refresh_only_if_dirty(self):
+        version = self.state().version
+        self.assertFalse(FilmworkSummary.refresh(if_dirty=True))
+        self.assertEqual(self.state().version, version)
+        filmwork = Filmwork.objects.create(
+            title='Empire', creation_date='1980-05-21', rating=8,
+            type=Filmwork.Type.MOVIE)
+        filmwork.genres.add(self.genre)
+        # изменения видны после обновления, а не при сохранении
+        self.assertFalse(FilmworkSummary.objects.exists())
+        self.assertTrue(FilmworkSummary.refresh(if_dirty=True))
+        state = self.state()
+        self.assertFalse(state.dirty)
+        self.assertEqual(state.version, version + 1)
+        self.assertEqual(FilmworkSummary.objects.get().genres, ['Sci-Fi'])
+
+    def test_failed_refresh_keeps_summary_dirty(self):
+        Person.objects.create(full_name='Mark Hamill')
+        with mock.patch.object(FilmworkSummaryState.objects, 'update',
+                               wraps=FilmworkSummaryState.objects.update,
+                               side_effect=[DatabaseError, mock.DEFAULT]):
+            with self.assertRaises(DatabaseError):
+                FilmworkSummary.refresh()
+        self.assertTrue(self.state().dirty)
+
+
+class TransferCommandsTest(TestCase):
+
+    def setUp(self):
+        self.filmwork = Filmwork.objects.create(
+            title='Star Wars', description='', creation_date='1977-05-25',
+            rating=8.6, type=Filmwork.Type.MOVIE)
+        genre = Genre.objects.create(name='Sci-Fi')
+        GenreFilmwork.objects.create(film_work=self.filmwork, genre=genre)
+        person = Person.objects.create(full_name='Mark Hamill')
+        PersonFilmwork.objects.create(
+            film_work=self.filmwork, person=person, role='actor')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def round_trip(self, fmt, *import_args):
+        call_command('export_movies', self.directory.name, format=fmt,
+                     stdout=io.StringIO())
+        Filmwork.objects.all().delete()
+        Genre.objects.all().delete()
+        Person.objects.all().delete()
+        call_command('import_movies', self.directory.name, *import_args,
+                     format=fmt, stdout=io.StringIO())
+
+    def test_round_trip(self):
+        for fmt in ('ndjson', 'csv'):
+            with self.subTest(fmt):
+                self.round_trip(fmt)
+                filmwork = Filmwork.objects.get(pk=self.filmwork.pk)
+                self.assertEqual(filmwork.modified, self.filmwork.modified)
+                self.assertEqual(filmwork.description, '')
+                self.assertEqual(
+                    list(filmwork.persons.values_list('full_name',
+                                                      flat=True)),
+                    ['Mark Hamill'])
+                self.assertEqual(GenreFilmwork.objects.count(), 1)
+
+    def test_update_existing_rows(self):
+        call_command('export_movies', self.directory.name,
+                     stdout=io.StringIO())
+        Filmwork.objects.filter(pk=self.filmwork.pk).update(title='Changed')
+        call_command('import_movies', self.directory.name,
+                     stdout=io.StringIO())
+        self.assertEqual(Filmwork.objects.get().title, 'Changed')
+        call_command('import_movies', self.directory.name, '--update',
+                     stdout=io.StringIO())
+        self.assertEqual(Filmwork.objects.get().title, 'Star Wars')
+
+    def test_models_imported_in_dependency_order(self):
+        models = ['person_film_work', 'film_work', 'person']
+        call_command('export_movies', self.directory.name,
+                     stdout=io.StringIO())
+        stdout = io.StringIO()
+        call_command('import_movies', self.directory.name,
+                     '--models', *models, stdout=stdout)
+        imported = [line.split(':')[0]
+                    for line in stdout.getvalue().splitlines()]
+        self.assertEqual(imported, [name for name in MODELS
+                                    if name in models])
+
+
+class RequestTimingMiddlewareTest(TestCase):
+
+    def test_server_timing_header(self):
+        with self.assertLogs('config.middleware', 'INFO') as logs:
+            response = self.client.get('/api/v1/movies/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], '/api/v1/movies/')
+        self.assertGreater(record['queries'], 0)
+        self.assertNotIn('top_queries', record)
+
+    @override_settings(REQUEST_TIMING_SLOW_MS=0, REQUEST_TIMING_TOP_QUERIES=1)
+    def test_slow_request_logs_top_queries(self):
+        with self.assertLogs('config.middleware', 'WARNING') as logs:
+            self.client.get('/api/v1/movies/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(len(record['top_queries']), 1)
@@ -0,0 +1,25 @@
+from django.contrib.admin.widgets import AutocompleteSelect
+
+
+class PrefetchedAutocompleteSelect(AutocompleteSelect):
+    """Автодополнение, которое берет подписи выбранных объектов из labels.
+
+    Стандартный виджет выполняет запрос за выбранным объектом в каждой
+    строке inline; labels заполняет формсет одним запросом на все строки.
+    """
+
+    labels = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = [str(v) for v in value
+                    if str(v) not in self.choices.field.empty_values]
+        if self.labels is None or any(pk not in self.labels
+                                      for pk in selected):
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        for pk in selected:
+            options.append(self.create_option(
+                name, pk, self.labels[pk], True, len(options)))
+        return [(None, options, 0)]
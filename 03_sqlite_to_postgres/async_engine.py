@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+
+import aiosqlite
+import asyncpg
+
+from postgres_saver import PostgresSaver, Schema
+from scheduler import Scheduler
+from sqlite_loader import SQLiteLoader
+from transform import Transform
+
+log = logging.getLogger()
+
+# Признак конца пакетов таблицы
+DONE = None
+
+
+class AsyncEngine(object):
+    """Полная загрузка на asyncio: aiosqlite и двоичный COPY asyncpg.
+
+    Используются те же tableclasses, PostgresSaver.Table и Schema, что
+    и в синхронной загрузке. Таблицы одного уровня зависимостей
+    загружаются одновременно на соединениях пула, каждая одной командой
+    COPY, в которую пакеты передаются по мере чтения из SQLite.
+    Продолжение загрузки и инкрементальная загрузка не поддерживаются.
+    """
+
+    def __init__(self, sqlite_path, dsl, dead_letter, packet_size=100,
+                 workers=1, depth=4, metrics=None):
+        self.sqlite_path = sqlite_path
+        self.dsl = dsl
+        self.dead_letter = dead_letter
+        self.packet_size = packet_size
+        self.workers = workers
+        # пакетов, прочитанных заранее, пока COPY отправляет предыдущие
+        self.depth = depth
+        self.metrics = metrics
+
+    async def read(self, table, packets):
+        try:
+            async with aiosqlite.connect(self.sqlite_path) as connection:
+                async with connection.execute(
+                        f"SELECT * FROM {table} ORDER BY id") as cursor:
+                    while True:
+                        started = time.perf_counter()
+                        rows = await cursor.fetchmany(self.packet_size)
+                        if not rows:
+                            break
+                        if self.metrics:
+                            self.metrics.add(table, "read",
+                                             time.perf_counter() - started,
+                                             rows)
+                        await packets.put(rows)
+        except Exception as error:
+            # ошибка передается в COPY, чтобы он не зафиксировал
+            # часть таблицы
+            await packets.put(error)
+        else:
+            await packets.put(DONE)
+
+    async def records(self, table, transform, packets):
+        # двоичный COPY принимает значения типов Python, к которым
+        # Transform приводит текст SQLite; uuid asyncpg принимает строкой
+        while (packet := await packets.get()) is not DONE:
+            if isinstance(packet, Exception):
+                raise packet
+            rows = table.rows(transform.packet(packet))
+            # время, пока COPY отправляет записи пакета
+            started = time.perf_counter()
+            for row in rows:
+                yield row
+            if self.metrics:
+                self.metrics.add(table.name, "write",
+                                 time.perf_counter() - started, rows)
+
+    async def load_table(self, pool, schema, name):
+        tableclass = SQLiteLoader.tableclasses[name]
+        table = PostgresSaver.Table(name, schema.columns[name],
+                                    schema.types[name], tableclass)
+        transform = Transform(name, tableclass, schema, self.dead_letter,
+                              metrics=self.metrics)
+        packets = asyncio.Queue(maxsize=self.depth)
+        started = time.perf_counter()
+        reader = asyncio.create_task(self.read(name, packets))
+        try:
+            async with pool.acquire() as connection:
+                result = await connection.copy_records_to_table(
+                    name, records=self.records(table, transform, packets),
+                    columns=table.columns, schema_name="content")
+            await reader
+        finally:
+            reader.cancel()
+        elapsed = time.perf_counter() - started
+        log.info(f"Table '{name}' loaded ({result}) in {elapsed:.2f}s, "
+                 f"engine 'async'")
+        if transform.rejected:
+            log.warning(f"Table '{name}': {transform.rejected} records "
+                        f"rejected, see {self.dead_letter.path}")
+
+    async def run(self):
+        async with asyncpg.create_pool(min_size=1, max_size=self.workers,
+                                       **self.dsl) as pool:
+            async with pool.acquire() as connection:
+                schema = Schema()
+                schema.load(await connection.fetch(Schema.query))
+                async with aiosqlite.connect(self.sqlite_path) as sqlite:
+                    rows = await sqlite.execute_fetchall(
+                        "SELECT name FROM sqlite_master WHERE type='table'")
+                    sqlite_tables = [row[0] for row in rows]
+                    tables = [table for table in schema.tables
+                              if table in sqlite_tables
+                              and table in SQLiteLoader.tableclasses]
+                    if self.metrics:
+                        for table in tables:
+                            count = await sqlite.execute_fetchall(
+                                f"SELECT count(*) FROM {table}")
+                            self.metrics.expect(table, count[0][0])
+                names = ", ".join(f"content.{table}" for table in tables)
+                await connection.execute(f"TRUNCATE {names} CASCADE")
+            scheduler = Scheduler(tables, schema.references,
+                                  workers=self.workers)
+            for level in scheduler.levels():
+                log.info(f"Loading tables {level}")
+                await asyncio.gather(*(self.load_table(pool, schema, table)
+                                       for table in level))
@@ -0,0 +1,43 @@
+import logging
+
+from metrics import row_bytes
+
+log = logging.getLogger()
+
+
+class AdaptiveBatcher(object):
+    """Размер пакета, подстраиваемый под объем и время записи пакетов.
+
+    После каждого пакета размер пересчитывается так, чтобы пакет
+    укладывался и в max_bytes, и в target_latency секунд записи.
+    За один шаг размер меняется не более чем вдвое.
+    """
+
+    sample_rows = 10  # записей для оценки объема пакета
+
+    def __init__(self, size=100, min_size=10, max_size=10000,
+                 max_bytes=4 * 1024 * 1024, target_latency=0.5):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self.size = self._clamp(size)
+
+    def _clamp(self, size):
+        return int(max(self.min_size, min(size, self.max_size)))
+
+    def row_bytes(self, rows):
+        return row_bytes(rows, self.sample_rows)
+
+    def observe(self, rows, latency):
+        """Учет записанного пакета: rows - записи, latency - время записи"""
+        if not rows:
+            return
+        limits = [self.max_size]
+        if row_bytes := self.row_bytes(rows):
+            limits.append(self.max_bytes / row_bytes)
+        if latency > 0:
+            limits.append(self.target_latency * len(rows) / latency)
+        target = min(limits)
+        self.size = self._clamp(
+            min(max(target, self.size / 2), self.size * 2))
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+
+import psycopg2
+
+from metrics import peak_rss_kb
+from postgres_saver import PostgresSaver
+from scheduler import Scheduler
+from sqlite_loader import SQLiteLoader
+from transform import DeadLetter, Transform
+
+
+class Stopwatch(object):
+    """Накопление времени по стадиям загрузки"""
+
+    def __init__(self):
+        self.stages = {"read": 0.0, "transform": 0.0, "write": 0.0}
+        self._started = None
+
+    def start(self):
+        self._started = time.perf_counter()
+
+    def stop(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] += now - self._started
+        self._started = now
+
+
+def benchmark_table(sqlite_loader, postgres_saver, table, dead_letter):
+    """Загрузка таблицы с раздельным замером чтения, преобразования и записи.
+
+    Преобразование - проверка записей Transform, как в load_data,
+    и перестановка полей в порядок колонок таблицы.
+    """
+    tableclass = sqlite_loader.tableclasses[table]
+    pg_table = postgres_saver.table(table, tableclass)
+    transform = Transform(table, tableclass, postgres_saver.schema,
+                          dead_letter, coerce=False)
+    write = postgres_saver.writer(pg_table)
+    stopwatch = Stopwatch()
+    rows = 0
+    stopwatch.start()
+    for packet in sqlite_loader.packets(table):
+        stopwatch.stop("read")
+        packet = transform.packet(packet)
+        rows_in_order = pg_table.rows(packet)
+        stopwatch.stop("transform")
+        if packet:
+            write(rows_in_order)
+        rows += len(packet)
+        stopwatch.stop("write")
+    postgres_saver.connection.commit()
+    stopwatch.stop("write")
+    total = sum(stopwatch.stages.values())
+    return {"rows": rows,
+            "rejected": transform.rejected,
+            **{f"{stage}_s": round(spent, 4)
+               for stage, spent in stopwatch.stages.items()},
+            "total_s": round(total, 4),
+            "rows_per_s": round(rows / (total or 1))}
+
+
+def run(sqlite_path, pg_conn, mode, packet_size, dead_letter_path):
+    started_at = datetime.now().isoformat(timespec="seconds")
+    with closing(sqlite3.connect(sqlite_path)) as connection, \
+            closing(DeadLetter(dead_letter_path)) as dead_letter:
+        sqlite_loader = SQLiteLoader(connection, packet_size=packet_size)
+        postgres_saver = PostgresSaver(pg_conn, mode=mode)
+        tables = [table for table in sqlite_loader.tables
+                  if table in sqlite_loader.tableclasses]
+        postgres_saver.truncate(tables)
+        scheduler = Scheduler(tables, postgres_saver.dependencies())
+        started = time.perf_counter()
+        results = {table: benchmark_table(sqlite_loader, postgres_saver,
+                                          table, dead_letter)
+                   for level in scheduler.levels() for table in level}
+    return {"started": started_at,
+            "sqlite": os.path.abspath(sqlite_path),
+            "sqlite_bytes": os.path.getsize(sqlite_path),
+            "mode": mode,
+            "packet_size": packet_size,
+            "tables": results,
+            "total_s": round(time.perf_counter() - started, 4),
+            "peak_rss_kb": peak_rss_kb()}
+
+
+def compare(result, baseline):
+    """Отношение скорости к предыдущему запуску по каждой таблице"""
+    for table, stats in result["tables"].items():
+        before = baseline["tables"].get(table)
+        if not before or not before["rows_per_s"]:
+            continue
+        ratio = stats["rows_per_s"] / before["rows_per_s"]
+        print(f"{table}: {stats['rows_per_s']} rows/s "
+              f"({ratio:.2f}x of baseline)")
+    print(f"peak RSS: {result['peak_rss_kb']} KB "
+          f"(baseline {baseline['peak_rss_kb']} KB)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark SQLite to PostgreSQL migration stages")
+    parser.add_argument("sldb", help="Path to file name SQLite")
+    parser.add_argument("dbname", help="PostgeSQL database name ")
+    parser.add_argument("user", help="PostgeSQL user")
+    parser.add_argument("password", help="PostgeSQL password")
+    parser.add_argument("--host", help="PostgeSQL host", default="127.0.0.1")
+    parser.add_argument("--port", help="PostgeSQL port", default=5432)
+    parser.add_argument("--mode", help="Write mode: INSERT batches or COPY",
+                        choices=PostgresSaver.modes, default="batch")
+    parser.add_argument("--packet-size", help="Records in one packet",
+                        type=int, default=100)
+    parser.add_argument("--output", help="JSON file with results",
+                        default="benchmark.json")
+    parser.add_argument("--compare", help="JSON file of a previous run")
+    parser.add_argument("--dead-letter", default="rejected.ndjson",
+                        help="NDJSON file for records rejected by validation")
+    args = parser.parse_args()
+
+    dsl = {'dbname': args.dbname, 'user': args.user,
+           'password': args.password, 'host': args.host, 'port': args.port}
+    with closing(psycopg2.connect(**dsl)) as pg_conn:
+        result = run(args.sldb, pg_conn, args.mode, args.packet_size,
+                     args.dead_letter)
+    with open(args.output, "w") as file:
+        json.dump(result, file, indent=2)
+    print(json.dumps(result, indent=2))
+    if args.compare:
+        with open(args.compare) as file:
+            compare(result, json.load(file))
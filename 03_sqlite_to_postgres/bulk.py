@@ -0,0 +1,97 @@
+import logging
+import time
+
+from psycopg2 import sql
+
+log = logging.getLogger()
+
+
+class DeferredConstraints(object):
+    """Внешние ключи, уникальные ограничения и индексы загружаемых таблиц.
+
+    drop удаляет их перед загрузкой, а restore создает заново по
+    сохраненным определениям, поэтому строки не проверяются и индексы
+    не обновляются при каждой вставке. Первичные ключи остаются.
+    Все выполняется в транзакции загрузки: если данные нарушают
+    ограничение, restore завершается ошибкой и загрузка откатывается.
+    """
+
+    def __init__(self, cursor, tables):
+        self.cursor = cursor
+        self.tables = list(tables)
+        self.constraints = self.load_constraints()
+        self.indexes = self.load_indexes()
+
+    def load_constraints(self):
+        # внешние ключи удаляются раньше уникальных ограничений,
+        # на которые они могут ссылаться, и создаются после них;
+        # удаляются и ключи других таблиц, ссылающиеся на загружаемые,
+        # иначе DROP CONSTRAINT уникального ограничения завершится ошибкой
+        self.cursor.execute("""
+                SELECT c.conrelid::regclass::text, c.conname, c.contype,
+                       pg_get_constraintdef(c.oid)
+                FROM pg_constraint c
+                JOIN pg_class r ON r.oid = c.conrelid
+                JOIN pg_namespace n ON n.oid = r.relnamespace
+                LEFT JOIN pg_class f ON f.oid = c.confrelid
+                LEFT JOIN pg_namespace fn ON fn.oid = f.relnamespace
+                WHERE c.contype IN ('f', 'u')
+                  AND (n.nspname = 'content' AND r.relname = ANY(%s)
+                       OR c.contype = 'f' AND fn.nspname = 'content'
+                          AND f.relname = ANY(%s))
+                ORDER BY c.contype, c.conname
+                """, (self.tables, self.tables))
+        return self.cursor.fetchall()
+
+    def load_indexes(self):
+        # индексы, не связанные с первичным ключом и ограничениями
+        self.cursor.execute("""
+                SELECT i.indexrelid::regclass::text,
+                       pg_get_indexdef(i.indexrelid)
+                FROM pg_index i
+                JOIN pg_class r ON r.oid = i.indrelid
+                JOIN pg_namespace n ON n.oid = r.relnamespace
+                WHERE n.nspname = 'content' AND r.relname = ANY(%s)
+                  AND NOT i.indisprimary
+                  AND NOT EXISTS (
+                      SELECT 1 FROM pg_constraint c
+                      WHERE c.conindid = i.indexrelid
+                        AND c.contype IN ('p', 'u', 'x'))
+                ORDER BY 1
+                """, (self.tables,))
+        return self.cursor.fetchall()
+
+    def drop(self):
+        for table, name, _, _ in self.constraints:
+            self.cursor.execute(
+                sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(
+                    sql.SQL(table), sql.Identifier(name)))
+        for index, _ in self.indexes:
+            self.cursor.execute(f"DROP INDEX {index}")
+        log.info(f"Dropped {len(self.constraints)} constraints and "
+                 f"{len(self.indexes)} indexes of {self.tables}")
+
+    def restore(self, workers=2, maintenance_work_mem="256MB"):
+        """Создание индексов и ограничений после загрузки.
+
+        B-tree индексы строятся параллельными процессами сервера,
+        число которых задает max_parallel_maintenance_workers.
+        """
+        started = time.perf_counter()
+        self.cursor.execute(
+            "SELECT set_config('max_parallel_maintenance_workers', %s, "
+            "true), set_config('maintenance_work_mem', %s, true)",
+            (str(workers), maintenance_work_mem))
+        for _, definition in self.indexes:
+            self.cursor.execute(definition)
+        for table, name, _, definition in reversed(self.constraints):
+            self.cursor.execute(
+                sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {}").format(
+                    sql.SQL(table), sql.Identifier(name),
+                    sql.SQL(definition)))
+        log.info(f"Restored constraints and indexes in "
+                 f"{time.perf_counter() - started:.2f}s")
+
+    def analyze(self):
+        names = ", ".join(f"content.{table}" for table in self.tables)
+        self.cursor.execute(f"ANALYZE {names}")
@@ -0,0 +1,61 @@
+class Checkpoint(object):
+    """Контрольные точки загрузки в таблице public.load_checkpoint.
+
+    Точка записывается в той же транзакции, что и пакеты таблицы,
+    поэтому она всегда соответствует последней зафиксированной записи.
+    Таблица лежит в схеме public, чтобы не смешиваться с данными content.
+    Кроме прогресса хранится high_water - наибольшее значение modified
+    в источнике на момент последней полной загрузки таблицы.
+    """
+
+    table = "public.load_checkpoint"
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def create(self):
+        self.cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    table_name TEXT PRIMARY KEY,
+                    last_id TEXT,
+                    done BOOLEAN NOT NULL DEFAULT FALSE,
+                    modified TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+                )
+                """)
+        self.cursor.execute(f"""
+                ALTER TABLE {self.table}
+                ADD COLUMN IF NOT EXISTS high_water TEXT
+                """)
+
+    def reset(self):
+        """Сброс прогресса загрузки с сохранением high_water"""
+        self.cursor.execute(
+            f"UPDATE {self.table} SET last_id = NULL, done = FALSE")
+
+    def load(self):
+        """Состояние таблиц:
+        {table_name: {"last_id": ..., "done": ..., "high_water": ...}}
+        """
+        self.cursor.execute(f"""
+                SELECT table_name, last_id, done, high_water
+                FROM {self.table}
+                """)
+        return {name: {"last_id": last_id, "done": done,
+                       "high_water": high_water}
+                for name, last_id, done, high_water
+                in self.cursor.fetchall()}
+
+    def save(self, table, last_id, done=False):
+        self.cursor.execute(f"""
+                INSERT INTO {self.table} (table_name, last_id, done)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (table_name) DO UPDATE
+                SET last_id = EXCLUDED.last_id, done = EXCLUDED.done,
+                    modified = NOW()
+                """, (table, last_id, done))
+
+    def save_high_water(self, table, high_water):
+        self.cursor.execute(f"""
+                UPDATE {self.table} SET high_water = %s, modified = NOW()
+                WHERE table_name = %s
+                """, (high_water, table))
@@ -1,14 +1,26 @@
 import argparse
+import asyncio
 import logging
+import os
 import sqlite3
+import sys
+import time
+import tracemalloc
 from contextlib import closing
+from functools import partial
 
 import psycopg2
-from psycopg2.extensions import connection as _connection
 from psycopg2.extras import DictCursor
+from psycopg2.pool import ThreadedConnectionPool
 
-from postgres_saver import PostgresSaver
+from bulk import DeferredConstraints
+from checkpoint import Checkpoint
+from metrics import Metrics, Profiler
+from pipeline import Pipeline, Progress
+from postgres_saver import PostgresSaver, Schema, refresh_summary
+from scheduler import Scheduler
 from sqlite_loader import SQLiteLoader
+from transform import DeadLetter, Transform
 
 logging.basicConfig(filename="logger.log", level=logging.INFO)
 log = logging.getLogger()
@@ -21,18 +33,271 @@ parser.add_argument("user", help="PostgeSQL user")
 parser.add_argument("password", help="PostgeSQL password")
 parser.add_argument("--host", help="PostgeSQL host", default="127.0.0.1")
 parser.add_argument("--port", help="PostgeSQL port", default=5432)
+parser.add_argument("--packet-size", help="Records in one packet",
+                    type=int, default=100)
+parser.add_argument("--adaptive", action="store_true",
+                    help="Adjust packet size to packet bytes and write time")
+parser.add_argument("--max-packet-size", help="Adaptive packet size limit",
+                    type=int, default=10000)
+parser.add_argument("--max-packet-bytes", help="Adaptive packet bytes limit",
+                    type=int, default=4 * 1024 * 1024)
+parser.add_argument("--target-latency",
+                    help="Adaptive target write time of a packet, seconds",
+                    type=float, default=0.5)
+parser.add_argument("--window", help="Packets written in one transaction",
+                    type=int, default=100)
+parser.add_argument("--mode", help="Write mode: INSERT batches or COPY",
+                    choices=PostgresSaver.modes, default="batch")
+parser.add_argument("--workers", help="Tables loaded in parallel",
+                    type=int, default=os.cpu_count() or 1)
+parser.add_argument("--pipeline-depth",
+                    help="Packets read ahead of writing in a separate "
+                         "thread, 0 - read and write in turn",
+                    type=int, default=4)
+parser.add_argument("--table-writers",
+                    help="Connections writing packets of one table",
+                    type=int, default=1)
+parser.add_argument("--engine", choices=("sync", "async"), default="sync",
+                    help="psycopg2 loader or asyncio loader on asyncpg "
+                         "and aiosqlite with binary COPY; async needs "
+                         "pip install -r requirements-async.txt")
+parser.add_argument("--bulk", action="store_true",
+                    help="Load all tables in one transaction with "
+                         "constraints and indexes rebuilt after the load")
+parser.add_argument("--dead-letter", default="rejected.ndjson",
+                    help="NDJSON file for records rejected by validation; "
+                         "--resume and --incremental do not retry them, "
+                         "fix them in SQLite and load with --since before "
+                         "their modified time")
+parser.add_argument("--metrics", default="-",
+                    help="File for JSON lines with progress and the final "
+                         "summary, - for stdout")
+parser.add_argument("--metrics-interval",
+                    help="Seconds between progress lines, 0 - summary only",
+                    type=float, default=5.0)
+parser.add_argument("--profile",
+                    help="Save cProfile statistics of all threads to file")
+parser.add_argument("--tracemalloc", action="store_true",
+                    help="Trace Python allocations and add the peak and "
+                         "top allocation sites to the summary")
+parser.add_argument("--resume", action="store_true",
+                    help="Continue from the last checkpoint")
+parser.add_argument("--incremental", action="store_true",
+                    help="Upsert only records modified since the last load")
+parser.add_argument("--since",
+                    help="Upsert only records modified after this timestamp")
+parser.add_argument("--no-refresh", action="store_true",
+                    help="Do not refresh content.film_work_summary of the "
+                         "admin panel after the load; then run "
+                         "manage.py refresh_film_work_summary")
 
 args = parser.parse_args()
+args.incremental = args.incremental or bool(args.since)
+if args.table_writers > 1 and not args.pipeline_depth:
+    parser.error("--table-writers requires --pipeline-depth")
+if args.bulk and (args.resume or args.incremental or args.table_writers > 1):
+    parser.error("--bulk loads everything in one transaction and can not "
+                 "be combined with --resume, --incremental or "
+                 "--table-writers")
+if args.engine == "async" and (args.resume or args.incremental or args.bulk
+                               or args.adaptive or args.table_writers > 1):
+    parser.error("--engine async performs a full load only and can not be "
+                 "combined with --resume, --incremental, --bulk, "
+                 "--adaptive or --table-writers")
+adaptive = None
+if args.adaptive:
+    adaptive = {"max_size": args.max_packet_size,
+                "max_bytes": args.max_packet_bytes,
+                "target_latency": args.target_latency}
+# при дозагрузке файл дополняется: ссылки на отклоненные раньше
+# записи отклоняются, пока записи не будут приняты или найдены в Postgres
+dead_letter = DeadLetter(args.dead_letter,
+                         append=args.resume or args.incremental)
+metrics = Metrics(sys.stdout if args.metrics == "-"
+                  else open(args.metrics, "w"), args.metrics_interval)
 
 
-def load_from_sqlite(connection: sqlite3.Connection, pg_conn: _connection):
+def load_table(sqlite_path: str, pg_pool: ThreadedConnectionPool,
+               schema: Schema, table: str, after: str = None,
+               since: str = None):
+    """Загрузка одной таблицы на собственных соединениях SQLite и Postgres"""
+
+    pg_conn = pg_pool.getconn()
+    try:
+        transfer_table(sqlite_path, pg_pool, pg_conn, schema, table, after,
+                       since)
+        pg_conn.commit()
+    finally:
+        pg_pool.putconn(pg_conn)
+
+
+def transfer_table(sqlite_path: str, pg_pool: ThreadedConnectionPool,
+                   pg_conn, schema: Schema, table: str, after: str = None,
+                   since: str = None):
+    """Запись таблицы на соединение pg_conn; фиксирует вызывающий"""
+
+    # при конвейере SQLite читается в отдельном потоке
+    with closing(sqlite3.connect(sqlite_path,
+                                 check_same_thread=False)) as connection:
+        postgres_saver = make_saver(pg_conn, schema)
+        sqlite_loader = SQLiteLoader(connection,
+                                     packet_size=args.packet_size,
+                                     adaptive=adaptive, metrics=metrics)
+        checkpoint = Checkpoint(postgres_saver.cursor)
+        # отметка берется до чтения: изменения во время загрузки
+        # попадут в следующую синхронизацию
+        high_water = sqlite_loader.high_water(table)
+        count = sqlite_loader.count(table)
+        pg_table = postgres_saver.table(
+            table, SQLiteLoader.tableclasses[table])
+        # ссылки отклоняются только на записи, которых нет в Postgres
+        dead_letter.reconcile(postgres_saver.cursor,
+                              schema.references[table])
+        # значения передаются серверу текстом и только проверяются
+        transform = Transform(table, SQLiteLoader.tableclasses[table],
+                              schema, dead_letter, coerce=False,
+                              metrics=metrics)
+        # размер пакета подстраивается под время записи в писателе
+        batcher = sqlite_loader.batcher()
+        observe = batcher.observe if batcher else None
+        packets = transform.packets(
+            sqlite_loader.packets(table, after, since, batcher))
+        if not args.pipeline_depth:
+            postgres_saver.save_table(pg_table, packets, count,
+                                      checkpoint, observe)
+        elif args.table_writers == 1:
+            Pipeline(args.pipeline_depth).run(packets, [
+                lambda items: postgres_saver.save_table(
+                    pg_table, (packet for _, packet in items), count,
+                    checkpoint, observe)])
+        else:
+            save_parallel(pg_pool, postgres_saver, pg_table, packets,
+                          count, checkpoint, observe)
+        checkpoint.save_high_water(table, high_water)
+        if transform.rejected:
+            log.warning(f"Table '{table}': {transform.rejected} records "
+                        f"rejected, see {dead_letter.path}")
+
+
+def make_saver(pg_conn, schema):
+    # несколько писателей фиксируют пакеты не по порядку, и после
+    # контрольной точки могут быть уже записанные пакеты, поэтому
+    # запись идет через ON CONFLICT; так же и при продолжении загрузки
+    upsert = args.incremental or args.resume or args.table_writers > 1
+    return PostgresSaver(pg_conn, window=args.window, mode=args.mode,
+                         upsert=upsert, schema=schema,
+                         single_transaction=args.bulk, metrics=metrics)
+
+
+def save_parallel(pg_pool, postgres_saver, pg_table, packets, count,
+                  checkpoint, observe=None):
+    """Запись таблицы несколькими писателями на отдельных соединениях"""
+
+    started = time.perf_counter()
+    progress = Progress()
+    savers = [postgres_saver]
+    try:
+        for _ in range(args.table_writers - 1):
+            savers.append(make_saver(pg_pool.getconn(),
+                                     postgres_saver.schema))
+        Pipeline(args.pipeline_depth).run(packets, [
+            partial(saver.save_shared, pg_table, progress=progress,
+                    checkpoint=Checkpoint(saver.cursor), observe=observe)
+            for saver in savers])
+    finally:
+        for saver in savers[1:]:
+            saver.connection.rollback()
+            pg_pool.putconn(saver.connection)
+    checkpoint.save(pg_table.name, progress.last_id, done=True)
+    postgres_saver.connection.commit()
+    elapsed = time.perf_counter() - started
+    log.info(f"Table '{pg_table.name}' loaded with "
+             f"{postgres_saver.count(pg_table.name)} of {count} records "
+             f"in {elapsed:.2f}s by {len(savers)} writers")
+
+
+def load_from_sqlite(sqlite_path: str, pg_pool: ThreadedConnectionPool):
     """Основной метод загрузки данных из SQLite в Postgres"""
 
-    postgres_saver = PostgresSaver(pg_conn)
-    sqlite_loader = SQLiteLoader(connection)
+    pg_conn = pg_pool.getconn()
+    try:
+        with closing(sqlite3.connect(sqlite_path)) as connection:
+            sqlite_tables = SQLiteLoader(connection).tables
+        postgres_saver = PostgresSaver(pg_conn)
+        schema = postgres_saver.schema
+        tables = [table for table in schema.tables
+                  if table in sqlite_tables
+                  and table in SQLiteLoader.tableclasses]
+        checkpoint = Checkpoint(postgres_saver.cursor)
+        checkpoint.create()
+        state = checkpoint.load()
+        if args.resume:
+            log.info(f"Resuming from checkpoint {state}")
+        else:
+            checkpoint.reset()
+            for table_state in state.values():
+                table_state.update(last_id=None, done=False)
+        tables = [table for table in tables
+                  if not state.get(table, {}).get("done")]
+        # при полной загрузке таблицы без прогресса загружаются с нуля
+        fresh = [table for table in tables
+                 if not state.get(table, {}).get("last_id")]
+        if fresh and not args.incremental and not args.bulk:
+            postgres_saver.truncate(fresh)
+        pg_conn.commit()
+        scheduler = Scheduler(tables, postgres_saver.dependencies(),
+                              workers=args.workers)
+        with closing(sqlite3.connect(sqlite_path)) as connection:
+            sqlite_loader = SQLiteLoader(connection)
+            for table in tables:
+                metrics.expect(table, sqlite_loader.count(table))
+    finally:
+        pg_pool.putconn(pg_conn)
+
+    def since(table):
+        if not args.incremental:
+            return None
+        return args.since or state.get(table, {}).get("high_water")
 
-    data = sqlite_loader.load_movies()
-    postgres_saver.save_all_data(data)
+    if args.bulk:
+        load_bulk(sqlite_path, pg_pool, schema, scheduler)
+        return
+    scheduler.run(lambda table: load_table(
+        sqlite_path, pg_pool, schema, table,
+        state.get(table, {}).get("last_id"), since(table)))
+
+
+def load_bulk(sqlite_path: str, pg_pool: ThreadedConnectionPool,
+              schema: Schema, scheduler: Scheduler):
+    """Загрузка всех таблиц в одной транзакции.
+
+    Таблицы очищаются, ограничения и индексы удаляются, после записи
+    создаются заново и проверяют все данные разом. Любая ошибка, в том
+    числе нарушение ограничения, откатывает загрузку целиком, включая
+    очистку таблиц. До фиксации таблицы заблокированы для чтения.
+    """
+
+    pg_conn = pg_pool.getconn()
+    try:
+        tables = [table for level in scheduler.levels() for table in level]
+        postgres_saver = make_saver(pg_conn, schema)
+        postgres_saver.truncate(tables)
+        constraints = DeferredConstraints(postgres_saver.cursor, tables)
+        constraints.drop()
+        for table in tables:
+            transfer_table(sqlite_path, pg_pool, pg_conn, schema, table)
+        started = time.perf_counter()
+        constraints.restore(workers=args.workers)
+        constraints.analyze()
+        metrics.add("bulk", "restore", time.perf_counter() - started)
+        started = time.perf_counter()
+        pg_conn.commit()
+        metrics.add("bulk", "commit", time.perf_counter() - started)
+    except BaseException:
+        pg_conn.rollback()
+        raise
+    finally:
+        pg_pool.putconn(pg_conn)
 
 
 if __name__ == '__main__':
@@ -42,13 +307,51 @@ if __name__ == '__main__':
            'host': args.host,
            'port': args.port
            }
+    if args.tracemalloc:
+        tracemalloc.start()
+    metrics.start()
+    # профилируются и потоки, запущенные после start
+    profiler = Profiler(args.profile) if args.profile else None
+    if profiler:
+        profiler.start()
     try:
-        with closing(sqlite3.connect(args.sldb)) as sqlite_conn, \
-                closing(psycopg2.connect(**dsl, cursor_factory=DictCursor)) as pg_conn:
-            load_from_sqlite(sqlite_conn, pg_conn)
+        if args.engine == "async":
+            # asyncpg и aiosqlite нужны только этому режиму
+            try:
+                from async_engine import AsyncEngine
+            except ImportError as error:
+                parser.error(f"--engine async: {error}; install "
+                             f"requirements-async.txt")
+            async_dsl = {'database': args.dbname, 'user': args.user,
+                         'password': args.password, 'host': args.host,
+                         'port': int(args.port)}
+            asyncio.run(AsyncEngine(args.sldb, async_dsl, dead_letter,
+                                    packet_size=args.packet_size,
+                                    workers=args.workers,
+                                    depth=args.pipeline_depth or 1,
+                                    metrics=metrics).run())
+        else:
+            pg_pool = ThreadedConnectionPool(
+                1, args.workers * args.table_writers, **dsl,
+                cursor_factory=DictCursor)
+            try:
+                load_from_sqlite(args.sldb, pg_pool)
+            finally:
+                pg_pool.closeall()
+        # API и админка читают представление, а не загруженные таблицы
+        if not args.no_refresh:
+            with closing(psycopg2.connect(**dsl)) as pg_conn:
+                refresh_summary(pg_conn)
     except sqlite3.Error:
         log.exception('SQLite')
     except psycopg2.DatabaseError:
         log.exception('PostgreSQL')
     except Exception:
         log.exception('load_from_sqlite')
+    finally:
+        if profiler:
+            profiler.stop()
+        metrics.stop()
+        if metrics.stream is not sys.stdout:
+            metrics.stream.close()
+        dead_letter.close()
@@ -0,0 +1,274 @@
+import bisect
+import cProfile
+import io
+import json
+import logging
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from itertools import islice
+
+log = logging.getLogger()
+
+
+def peak_rss_kb():
+    # ru_maxrss в Linux в килобайтах, в macOS в байтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def row_bytes(rows, sample_rows=10):
+    """Средний объем записи по первым sample_rows записям пакета"""
+    sample = list(islice(rows, sample_rows))
+    total = sum(len(value) if isinstance(value, str) else 8
+                for row in sample for value in row if value is not None)
+    return total / len(sample) if sample else 0
+
+
+class Histogram(object):
+    """Число пакетов по интервалам задержки в миллисекундах"""
+
+    bounds = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds * 1000)] += 1
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+
+    def as_dict(self):
+        labels = [f"<={bound}" for bound in self.bounds]
+        labels.append(f">{self.bounds[-1]}")
+        return {label: count for label, count in zip(labels, self.counts)
+                if count}
+
+
+class Stage(object):
+    """Пакеты, записи, объем и время одной стадии загрузки"""
+
+    def __init__(self):
+        self.batches = 0
+        self.rows = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = Histogram()
+
+    def add(self, seconds, rows, size):
+        self.batches += 1
+        self.rows += rows
+        self.bytes += size
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.histogram.add(seconds)
+
+    def merge(self, other):
+        self.batches += other.batches
+        self.rows += other.rows
+        self.bytes += other.bytes
+        self.seconds += other.seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+        self.histogram.merge(other.histogram)
+
+    def as_dict(self, histogram=False):
+        result = {
+            "batches": self.batches,
+            "rows": self.rows,
+            "bytes": int(self.bytes),
+            "seconds": round(self.seconds, 3),
+            "rows_per_s": (round(self.rows / self.seconds)
+                           if self.rows and self.seconds else None),
+            "mean_ms": (round(self.seconds * 1000 / self.batches, 2)
+                        if self.batches else None),
+            "max_ms": round(self.max_seconds * 1000, 2),
+        }
+        if histogram:
+            result["histogram_ms"] = self.histogram.as_dict()
+        return result
+
+
+class Metrics(object):
+    """Метрики стадий загрузки (read, transform, write, commit) по таблицам.
+
+    Стадии сообщают время и записи каждого пакета через add. Поток
+    отчета раз в interval секунд пишет в stream строку JSON с прогрессом,
+    скоростью и оценкой оставшегося времени, а stop - итоговую сводку
+    с гистограммами задержек и пиковой памятью. Загруженными считаются
+    записи, прошедшие стадию write. Объем в байтах оценивается по
+    нескольким записям пакета.
+    """
+
+    progress_stage = "write"
+
+    def __init__(self, stream, interval=5.0):
+        self.stream = stream
+        self.interval = interval
+        self.tables = {}
+        self.totals = {}
+        self.first_seen = {}
+        self.started = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reporter = threading.Thread(target=self.report, daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.interval:
+            self._reporter.start()
+
+    def expect(self, table, total):
+        """Число записей таблицы для оценки оставшегося времени"""
+        with self._lock:
+            self.totals[table] = total
+
+    def add(self, table, stage, seconds, rows=()):
+        count = len(rows)
+        size = row_bytes(rows) * count if count else 0
+        with self._lock:
+            stages = self.tables.get(table)
+            if stages is None:
+                stages = self.tables[table] = {}
+                self.first_seen[table] = time.perf_counter()
+            if stage not in stages:
+                stages[stage] = Stage()
+            stages[stage].add(seconds, count, size)
+
+    def loaded(self, table):
+        stage = self.tables.get(table, {}).get(self.progress_stage)
+        return stage.rows if stage else 0
+
+    @staticmethod
+    def eta(done, total, rate):
+        if total is None or not rate:
+            return None
+        return round(max(total - done, 0) / rate, 1)
+
+    def progress(self):
+        now = time.perf_counter()
+        elapsed = now - self.started
+        tables = {}
+        with self._lock:
+            for table, stages in self.tables.items():
+                done = self.loaded(table)
+                total = self.totals.get(table)
+                rate = done / (now - self.first_seen[table] or 1)
+                tables[table] = {
+                    "rows": done, "total": total,
+                    "eta_s": self.eta(done, total, rate),
+                    "stages": {stage: {key: value for key, value
+                                       in counters.as_dict().items()
+                                       if key in ("rows_per_s", "mean_ms")}
+                               for stage, counters in stages.items()},
+                }
+            rows = sum(map(self.loaded, self.tables))
+            total = sum(self.totals.values()) if self.totals else None
+        rate = rows / (elapsed or 1)
+        return {"event": "progress", "elapsed_s": round(elapsed, 1),
+                "rows": rows, "total": total, "rows_per_s": round(rate),
+                "eta_s": self.eta(rows, total, rate),
+                "peak_rss_kb": peak_rss_kb(), "tables": tables}
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        totals = {}
+        with self._lock:
+            for stages in self.tables.values():
+                for stage, counters in stages.items():
+                    totals.setdefault(stage, Stage()).merge(counters)
+            tables = {table: {stage: counters.as_dict(histogram=True)
+                              for stage, counters in stages.items()}
+                      for table, stages in self.tables.items()}
+            rows = sum(map(self.loaded, self.tables))
+        summary = {"event": "summary", "elapsed_s": round(elapsed, 3),
+                   "rows": rows, "rows_per_s": round(rows / (elapsed or 1)),
+                   "peak_rss_kb": peak_rss_kb(),
+                   "stages": {stage: counters.as_dict(histogram=True)
+                              for stage, counters in totals.items()},
+                   "tables": tables}
+        if tracemalloc.is_tracing():
+            summary["tracemalloc"] = self.traced_memory()
+        return summary
+
+    @staticmethod
+    def traced_memory(limit=10):
+        """Пик памяти, выделенной Python, и строки с наибольшим объемом"""
+        _, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+        return {"peak_kb": peak // 1024,
+                "top": [{"line": str(stat.traceback),
+                         "size_kb": stat.size // 1024, "count": stat.count}
+                        for stat in top]}
+
+    def emit(self, record):
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+    def report(self):
+        while not self._stop.wait(self.interval):
+            self.emit(self.progress())
+
+    def stop(self):
+        """Остановка потока отчета и вывод итоговой сводки"""
+        self._stop.set()
+        if self._reporter.is_alive():
+            self._reporter.join()
+        summary = self.summary()
+        self.emit(summary)
+        log.info(f"Loaded {summary['rows']} records in "
+                 f"{summary['elapsed_s']}s ({summary['rows_per_s']} rows/s), "
+                 f"peak RSS {summary['peak_rss_kb']} KB")
+
+
+class Profiler(object):
+    """cProfile всех потоков загрузки.
+
+    До Python 3.12 cProfile профилирует только поток, в котором
+    включен, поэтому каждый новый поток при старте включает собственный
+    профиль, а stop объединяет их и сохраняет статистику в path.
+    С 3.12 cProfile работает через sys.monitoring: активен может быть
+    только один профиль, и он получает события всех потоков.
+    """
+
+    per_thread = sys.version_info < (3, 12)
+
+    def __init__(self, path, limit=20):
+        self.path = path
+        self.limit = limit
+        self.profiles = []
+        self._lock = threading.Lock()
+
+    def enable(self):
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def enable_thread(self, frame, event, arg):
+        # вызывается при первом событии нового потока
+        sys.setprofile(None)
+        self.enable()
+
+    def start(self):
+        if self.per_thread:
+            threading.setprofile(self.enable_thread)
+        else:
+            log.warning("Threads share one cProfile profile: calls of "
+                        "concurrent threads are mixed in cumulative times")
+        self.enable()
+
+    def stop(self):
+        if self.per_thread:
+            threading.setprofile(None)
+        for profile in self.profiles:
+            profile.disable()
+        stats = pstats.Stats(*self.profiles)
+        stats.dump_stats(self.path)
+        report = io.StringIO()
+        stats.stream = report
+        stats.sort_stats("cumulative").print_stats(self.limit)
+        log.info(f"Profile saved to {self.path}\n{report.getvalue()}")
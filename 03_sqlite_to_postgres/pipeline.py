@@ -0,0 +1,117 @@
+import logging
+import queue
+import threading
+
+log = logging.getLogger()
+
+# Признак конца пакетов для писателя
+DONE = object()
+
+
+class PipelineStopped(Exception):
+    """Конвейер остановлен из-за ошибки в другом потоке"""
+
+
+class Progress(object):
+    """Наибольший непрерывный номер пакета, записанного писателями.
+
+    Писатели фиксируют пакеты в своих транзакциях в произвольном
+    порядке, поэтому контрольной точкой можно считать только пакет,
+    все предыдущие пакеты которого тоже зафиксированы.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = 0
+        self._committed = {}
+        self.last_id = None
+
+    def commit(self, packets):
+        """Отметка зафиксированных пакетов [(номер, последний id), ...]"""
+        with self._lock:
+            self._committed.update(packets)
+            while self._next in self._committed:
+                self.last_id = self._committed.pop(self._next)
+                self._next += 1
+            return self.last_id
+
+
+class Pipeline(object):
+    """Чтение пакетов в отдельном потоке параллельно с их записью.
+
+    Поток чтения кладет пронумерованные пакеты в очередь из depth
+    элементов и ждет, пока писатели ее освободят, поэтому в памяти не
+    больше depth пакетов. Ошибка любого потока останавливает остальные
+    и пробрасывается из run.
+    """
+
+    timeout = 0.1
+
+    def __init__(self, depth=4):
+        self.queue = queue.Queue(maxsize=depth)
+        self.stop = threading.Event()
+        self.errors = []
+
+    def fail(self, error):
+        self.errors.append(error)
+        self.stop.set()
+
+    def put(self, item):
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=self.timeout)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read(self, packets, writers):
+        try:
+            for item in enumerate(packets):
+                if not self.put(item):
+                    return
+        except BaseException as error:
+            self.fail(error)
+        finally:
+            for _ in range(writers):
+                self.put(DONE)
+
+    def items(self):
+        """Пакеты (номер, пакет) для одного писателя"""
+        while True:
+            if self.stop.is_set():
+                raise PipelineStopped()
+            try:
+                item = self.queue.get(timeout=self.timeout)
+            except queue.Empty:
+                continue
+            if item is DONE:
+                return
+            yield item
+
+    def write(self, writer):
+        try:
+            writer(self.items())
+        except PipelineStopped:
+            pass
+        except BaseException as error:
+            self.fail(error)
+
+    def run(self, packets, writers):
+        """Запуск чтения и писателей writer(items) до завершения.
+
+        Первый писатель выполняется в текущем потоке, остальные
+        в отдельных, чтобы соединение одного писателя оставалось
+        в потоке, где оно создано.
+        """
+        threads = [threading.Thread(target=self.read,
+                                    args=(packets, len(writers)))]
+        threads += [threading.Thread(target=self.write, args=(writer,))
+                    for writer in writers[1:]]
+        for thread in threads:
+            thread.start()
+        self.write(writers[0])
+        for thread in threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
@@ -1,25 +1,143 @@
+import io
 import logging
-from dataclasses import asdict
+import time
+from dataclasses import fields
+from functools import partial
+from operator import itemgetter
 
+import psycopg2.errors
 import psycopg2.extras
 
 log = logging.getLogger()
 
+# экранирование значений для текстового формата COPY
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t",
+                              "\n": "\\n", "\r": "\\r"})
+COPY_NULL = "\\N"
+
+
+def refresh_summary(pg_conn, concurrently=True):
+    """Обновление content.film_work_summary панели администратора.
+
+    Представление и строка его состояния создаются миграциями
+    02_movies_admin (0005, 0006); в базе только со схемой
+    01_schema_design обновлять нечего. Если сброс флага изменений не
+    дождался транзакций других писателей, флаг остается, и
+    представление обновит refresh_film_work_summary --if-dirty.
+    Возвращает, было ли представление обновлено.
+    """
+    cursor = pg_conn.cursor()
+    cursor.execute("SELECT to_regclass('content.film_work_summary_state')")
+    if cursor.fetchone()[0] is None:
+        return False
+    started = time.perf_counter()
+    try:
+        cursor.execute("SELECT content.film_work_summary_begin_refresh()")
+    except psycopg2.errors.LockNotAvailable:
+        pg_conn.rollback()
+        log.warning("film_work_summary is not refreshed: tables are locked "
+                    "by other writers, run refresh_film_work_summary")
+        return False
+    pg_conn.commit()
+    option = "CONCURRENTLY " if concurrently else ""
+    try:
+        cursor.execute(f"REFRESH MATERIALIZED VIEW {option}"
+                       f"content.film_work_summary")
+        cursor.execute("""
+                UPDATE content.film_work_summary_state
+                SET version = version + 1, refreshed = now()
+                """)
+        pg_conn.commit()
+    except psycopg2.DatabaseError:
+        pg_conn.rollback()
+        cursor.execute(
+            "UPDATE content.film_work_summary_state SET dirty = true")
+        pg_conn.commit()
+        raise
+    log.info(f"film_work_summary refreshed in "
+             f"{time.perf_counter() - started:.2f}s")
+    return True
+
+
+class Schema(object):
+    """Метаданные таблиц схемы content: колонки, типы, NOT NULL, ссылки.
+
+    Загружаются одним запросом к системному каталогу и передаются
+    всем экземплярам PostgresSaver.
+    """
+
+    query = """
+            SELECT c.relname, a.attname,
+                format_type(a.atttypid, a.atttypmod), a.attnotnull,
+                ARRAY(SELECT DISTINCT r.relname::text
+                      FROM pg_constraint con
+                      JOIN pg_class r ON r.oid = con.confrelid
+                      WHERE con.conrelid = c.oid AND con.contype = 'f')
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_attribute a ON a.attrelid = c.oid
+            WHERE n.nspname = 'content' AND c.relkind IN ('r', 'p')
+                AND a.attnum > 0 AND NOT a.attisdropped
+            ORDER BY c.relname, a.attnum
+            """
+
+    def __init__(self, cursor=None):
+        self.columns = {}
+        self.types = {}
+        self.notnull = {}
+        self.references = {}
+        if cursor is not None:
+            cursor.execute(self.query)
+            self.load(cursor.fetchall())
+
+    def load(self, rows):
+        """Заполнение по строкам query, полученным любым драйвером"""
+        for table, column, type_, notnull, references in rows:
+            self.columns.setdefault(table, []).append(column)
+            self.types.setdefault(table, []).append(type_)
+            notnulls = self.notnull.setdefault(table, set())
+            if notnull:
+                notnulls.add(column)
+            self.references[table] = set(references)
+
+    @property
+    def tables(self):
+        return sorted(self.columns)
+
 
 class PostgresSaver(object):
 
     class Table(object):
-        def __init__(self, cursor, name):
-            self.cursor = cursor
+        """Таблица content с порядком колонок, согласованным с tableclass.
+
+        Записи пакета - кортежи в порядке полей dataclass из tableclasses.
+        Позиции колонок Postgres в записи вычисляются один раз, колонки
+        без соответствующего поля не заполняются.
+        """
+
+        def __init__(self, name, columns, types, tableclass=None):
             self._name = name
-            self._columns = self._load_columns()
+            self._columns = list(columns)
+            self._types = list(types)
+            self._getter = None
+            if tableclass:
+                self._bind(tableclass)
 
-        def _load_columns(self):
-            self.cursor.execute(f"""
-                    SELECT column_name FROM INFORMATION_SCHEMA.COLUMNS
-                    WHERE TABLE_NAME = '{self.name}'
-                    """)
-            return [column[0] for column in self.cursor.fetchall()]
+        def _bind(self, tableclass):
+            names = [field.name for field in fields(tableclass)]
+            bound = [(col, type_) for col, type_
+                     in zip(self._columns, self._types) if col in names]
+            self._columns = [col for col, _ in bound]
+            self._types = [type_ for _, type_ in bound]
+            positions = [names.index(col) for col in self._columns]
+            if positions != list(range(len(names))):
+                self._getter = itemgetter(*positions)
+
+        def rows(self, packet):
+            """Записи пакета в порядке колонок таблицы"""
+            if self._getter is None:
+                return packet
+            return list(map(self._getter, packet))
 
         @property
         def name(self):
@@ -29,39 +147,193 @@ class PostgresSaver(object):
         def columns(self):
             return self._columns
 
-    def __init__(self, pg_conn):
+        @property
+        def types(self):
+            return self._types
+
+    modes = ("batch", "copy")
+
+    def __init__(self, pg_conn, window=None, mode="batch", upsert=False,
+                 schema=None, single_transaction=False, metrics=None):
+        if mode not in self.modes:
+            raise ValueError(f"Unknown write mode '{mode}'")
+        self.mode = mode
+        self.connection = pg_conn
         self.cursor = pg_conn.cursor()
+        # количество пакетов, записываемых в одной транзакции;
+        # None - вся таблица в одной транзакции
+        self.window = window
+        # обновление существующих записей вместо ошибки дубликата id
+        self.upsert = upsert
+        self.schema = schema or Schema(self.cursor)
+        # вся загрузка в одной транзакции, которую фиксирует вызывающий
+        self.single_transaction = single_transaction
+        self.metrics = metrics
 
-    def list_tables(self):
-        self.cursor.execute("""
-                SELECT table_name FROM information_schema.tables
-                WHERE table_schema = 'content' ORDER BY table_name
-                """)
-        return self.cursor.fetchall()
+    def commit(self, table=None):
+        if self.single_transaction:
+            return
+        started = time.perf_counter()
+        self.connection.commit()
+        if self.metrics and table:
+            self.metrics.add(table, "commit", time.perf_counter() - started)
 
-    def insert(self, table, columns, args, data):
-        psycopg2.extras.execute_batch(self.cursor, f"""
-                INSERT INTO content.{table} ({columns}) VALUES ({args})
-                """, [asdict(item) for item in data])
+    def write(self, write, table, packet, observe=None):
+        """Запись пакета функцией writer(table) с учетом в метриках.
+
+        observe(rows, latency) получает время записи пакета, например
+        AdaptiveBatcher.observe.
+        """
+        rows = table.rows(packet)
+        started = time.perf_counter()
+        write(rows)
+        latency = time.perf_counter() - started
+        if self.metrics:
+            self.metrics.add(table.name, "write", latency, rows)
+        if observe:
+            observe(rows, latency)
+
+    def dependencies(self):
+        """Таблицы схемы content, на которые ссылается каждая таблица"""
+        return self.schema.references
+
+    def truncate(self, tables):
+        names = ", ".join(f"content.{table}" for table in tables)
+        self.cursor.execute(f"TRUNCATE {names} CASCADE")
+        self.commit()
+
+    def conflict_for(self, table):
+        if not self.upsert:
+            return ""
+        updates = ", ".join(f"{col} = EXCLUDED.{col}"
+                            for col in table.columns if col != "id")
+        return f"ON CONFLICT (id) DO UPDATE SET {updates}"
+
+    def prepare(self, table, conflict=""):
+        """Подготовленный на сервере INSERT; один на таблицу в сессии"""
+        statement = f"{'upsert' if conflict else 'insert'}_{table.name}"
+        self.cursor.execute(
+            "SELECT 1 FROM pg_prepared_statements WHERE name = %s",
+            (statement,))
+        if not self.cursor.fetchone():
+            types = ",".join(table.types)
+            columns = ",".join(table.columns)
+            args = ",".join(f"${number}" for number
+                            in range(1, len(table.columns) + 1))
+            self.cursor.execute(f"""
+                    PREPARE {statement} ({types}) AS
+                    INSERT INTO content.{table.name} ({columns})
+                    VALUES ({args}) {conflict}
+                    """)
+        return statement
+
+    def insert(self, statement, args, data):
+        psycopg2.extras.execute_batch(
+            self.cursor, f"EXECUTE {statement} ({args})", data)
+
+    @staticmethod
+    def copy_value(value):
+        return COPY_NULL if value is None else str(value).translate(
+            COPY_ESCAPES)
+
+    def copy(self, table, columns, data, conflict=""):
+        """Запись пакета через COPY FROM STDIN без построения dict на запись.
+
+        С conflict пакет копируется во временную таблицу и переносится
+        в content через INSERT ... SELECT с обработкой конфликтов.
+        """
+        buffer = io.StringIO()
+        for row in data:
+            buffer.write("\t".join(map(self.copy_value, row)))
+            buffer.write("\n")
+        buffer.seek(0)
+        if not conflict:
+            self.cursor.copy_expert(
+                f"COPY content.{table} ({columns}) FROM STDIN", buffer)
+            return
+        staging = f"staging_{table}"
+        self.cursor.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS {staging}
+                (LIKE content.{table})
+                """)
+        self.cursor.copy_expert(
+            f"COPY {staging} ({columns}) FROM STDIN", buffer)
+        self.cursor.execute(f"""
+                INSERT INTO content.{table} ({columns})
+                SELECT {columns} FROM {staging}
+                {conflict}
+                """)
+        self.cursor.execute(f"TRUNCATE {staging}")
 
     def count(self, table):
         self.cursor.execute(f"SELECT count(*) FROM content.{table}")
         return self.cursor.fetchone()[0]
 
-    @property
-    def tables(self):
-        return (self.Table(self.cursor, t[0]) for t in self.list_tables())
+    def table(self, name, tableclass=None):
+        return self.Table(name, self.schema.columns[name],
+                          self.schema.types[name], tableclass)
 
-    def save_all_data(self, data):
-        for table in self.tables:
-            if not data.get(table.name):
-                continue
-            self.cursor.execute(f"TRUNCATE content.{table.name} CASCADE")
-            columns = ",".join(table.columns)
-            args = ",".join([f"%({col})s" for col in table.columns])
-            packets = data[table.name]["packets"]
-            count = data[table.name]["count_rows"]
-            for packet in packets:
-                self.insert(table.name, columns, args, packet)
-            log.info(f"Table '{table.name}' loaded with "
-                     f"{self.count(table.name)} of {count} records")
+    def writer(self, table):
+        """Функция записи пакета в таблицу; SQL строится один раз.
+
+        Функция принимает записи в порядке колонок - результат table.rows().
+        """
+        columns = ",".join(table.columns)
+        conflict = self.conflict_for(table)
+        if self.mode == "copy":
+            return partial(self.copy, table.name, columns, conflict=conflict)
+        args = ",".join(["%s"] * len(table.columns))
+        return partial(self.insert, self.prepare(table, conflict), args)
+
+    def save_table(self, table, packets, count, checkpoint=None,
+                   observe=None):
+        """Запись пакетов таблицы по мере их чтения из источника.
+
+        При переданной контрольной точке вместе с каждой транзакцией
+        фиксируется id последней записанной записи.
+        """
+        write = self.writer(table)
+        rows = 0
+        last_id = None
+        started = time.perf_counter()
+        for number, packet in enumerate(packets, 1):
+            self.write(write, table, packet, observe)
+            rows += len(packet)
+            last_id = packet[-1][0]  # id - первое поле всех tableclasses
+            if self.window and number % self.window == 0:
+                if checkpoint:
+                    checkpoint.save(table.name, last_id)
+                self.commit(table.name)
+        if checkpoint:
+            checkpoint.save(table.name, last_id, done=True)
+        self.commit(table.name)
+        elapsed = time.perf_counter() - started
+        log.info(f"Table '{table.name}' loaded with "
+                 f"{self.count(table.name)} of {count} records "
+                 f"in {elapsed:.2f}s ({rows / (elapsed or 1):.0f} rows/s, "
+                 f"mode '{self.mode}')")
+
+    def save_shared(self, table, items, progress, checkpoint=None,
+                    observe=None):
+        """Запись пакетов (номер, пакет) одним из нескольких писателей.
+
+        Каждые window пакетов транзакция фиксируется, а контрольная точка
+        сохраняется отдельной транзакцией по общему progress, поэтому
+        она не опережает пакеты, зафиксированные другими писателями.
+        """
+        write = self.writer(table)
+        written = []
+        for number, (seq, packet) in enumerate(items, 1):
+            self.write(write, table, packet, observe)
+            written.append((seq, packet[-1][0]))
+            if self.window and number % self.window == 0:
+                self.commit_shared(table, written, progress, checkpoint)
+                written = []
+        self.commit_shared(table, written, progress, checkpoint)
+
+    def commit_shared(self, table, written, progress, checkpoint):
+        self.commit(table.name)
+        last_id = progress.commit(written)
+        if checkpoint and last_id is not None:
+            checkpoint.save(table.name, last_id)
+            self.commit()
@@ -0,0 +1,45 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger()
+
+
+class Scheduler(object):
+    """Планировщик загрузки таблиц с учетом внешних ключей.
+
+    Таблицы разбиваются на уровни: таблица попадает на уровень только
+    после всех таблиц, на которые она ссылается. Таблицы одного уровня
+    загружаются параллельно.
+    """
+
+    def __init__(self, tables, dependencies, workers=1):
+        self.tables = set(tables)
+        # ссылки на таблицы, которые не загружаются, не учитываются
+        self.dependencies = {
+            table: set(dependencies.get(table, ())) & self.tables - {table}
+            for table in self.tables}
+        self.workers = workers
+
+    def levels(self):
+        pending = dict(self.dependencies)
+        done = set()
+        while pending:
+            level = sorted(table for table, refs in pending.items()
+                           if refs <= done)
+            if not level:
+                raise ValueError(
+                    f"Cyclic foreign keys between tables {sorted(pending)}")
+            for table in level:
+                del pending[table]
+            done.update(level)
+            yield level
+
+    def run(self, load_table):
+        """Вызов load_table для каждой таблицы, уровень за уровнем"""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for level in self.levels():
+                log.info(f"Loading tables {level}")
+                # result() пробрасывает исключение из потока загрузки
+                for future in [executor.submit(load_table, table)
+                               for table in level]:
+                    future.result()
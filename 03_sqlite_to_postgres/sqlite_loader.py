@@ -1,17 +1,38 @@
+import logging
+import time
+
+from batcher import AdaptiveBatcher
 from tableclasses import FilmWork, Genre, GenreFilmWork, Person, PersonFilmWork
 
 
+log = logging.getLogger()
+
+
 class SQLiteLoader(object):
-    def __init__(self, connection):
-        self.packet_size = 100  # количество записей в пакете
+    tableclasses = {
+        "film_work": FilmWork,
+        "genre": Genre,
+        "person": Person,
+        "genre_film_work": GenreFilmWork,
+        "person_film_work": PersonFilmWork
+    }
+    # колонки SQLite со временем последнего изменения записи
+    modified_columns = {
+        "film_work": "updated_at",
+        "genre": "updated_at",
+        "person": "updated_at",
+        "genre_film_work": "created_at",
+        "person_film_work": "created_at"
+    }
+
+    def __init__(self, connection, packet_size=100, adaptive=None,
+                 metrics=None):
+        self.packet_size = packet_size  # количество записей в пакете
+        # параметры AdaptiveBatcher; None - постоянный размер пакета
+        self.adaptive = adaptive
+        self.metrics = metrics
+        self.connection = connection
         self.cursor = connection.cursor()
-        self.tableclasses = {
-            "film_work": FilmWork,
-            "genre": Genre,
-            "person": Person,
-            "genre_film_work": GenreFilmWork,
-            "person_film_work": PersonFilmWork
-        }
 
     def list_tables(self):
         return self.query("SELECT name FROM sqlite_master WHERE type='table'")
@@ -24,7 +45,8 @@ class SQLiteLoader(object):
         return cur.fetchone()
 
     def query_many(self, sql, size=None):
-        cur = self.cursor.execute(sql)
+        # отдельный курсор, чтобы генераторы разных таблиц не мешали друг другу
+        cur = self.connection.cursor().execute(sql)
         if size:
             while rows := cur.fetchmany(size):
                 yield rows
@@ -38,22 +60,60 @@ class SQLiteLoader(object):
     def read(self, table, size=None):
         return self.query(self.query_for(table), size=size)
 
+    def batcher(self):
+        """AdaptiveBatcher по параметрам adaptive или None"""
+        if self.adaptive is None:
+            return None
+        return AdaptiveBatcher(self.packet_size, **self.adaptive)
+
+    def read_after(self, table, after=None, since=None, batcher=None):
+        """Постраничное чтение по первичному ключу (keyset pagination).
+
+        При переданном since читаются только записи, измененные позже.
+        Размер пакета берется из batcher, которому время записи пакетов
+        сообщает писатель: при конвейере время между пакетами - это
+        ожидание места в очереди, а не запись.
+        """
+        after = after or ""
+        sql = f"SELECT * FROM {table} WHERE id > ?"
+        params = ()
+        if since:
+            sql += f" AND {self.modified_columns[table]} > ?"
+            params = (since,)
+        sql += " ORDER BY id LIMIT ?"
+        while True:
+            size = batcher.size if batcher else self.packet_size
+            started = time.perf_counter()
+            rows = self.connection.execute(
+                sql, (after, *params, size)).fetchall()
+            if not rows:
+                break
+            if self.metrics:
+                self.metrics.add(table, "read",
+                                 time.perf_counter() - started, rows)
+            yield rows
+            after = rows[-1][0]
+        if batcher:
+            log.info(f"Table '{table}' packet size settled at {batcher.size}")
+
     def count(self, table):
         count = self.query(f"SELECT count(*) FROM {table}", one=True)
         return count[0]
 
+    def high_water(self, table):
+        """Наибольшее время изменения записей таблицы"""
+        return self.query(
+            f"SELECT max({self.modified_columns[table]}) FROM {table}",
+            one=True)[0]
+
     @property
     def tables(self):
         return [table[0][0] for table in self.list_tables()]
 
-    def load_movies(self):
-        data = {}
-        for table in self.tables:
-            if not self.tableclasses.get(table):
-                continue
-            data[table] = {"packets": [], "count_rows": self.count(table)}
-            packets = self.read(table, self.packet_size)
-            for packet in packets:
-                data[table]["packets"].append(
-                    [self.tableclasses[table](*_) for _ in packet])
-        return data
+    def packets(self, table, after=None, since=None, batcher=None):
+        """Генератор пакетов таблицы: в памяти находится только один пакет.
+
+        Записи читаются по возрастанию id, начиная после after, и
+        передаются кортежами в порядке полей dataclass таблицы.
+        """
+        return self.read_after(table, after, since, batcher)
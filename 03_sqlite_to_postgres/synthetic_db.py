@@ -0,0 +1,151 @@
+import argparse
+import hashlib
+import random
+import sqlite3
+import uuid
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+# Схема повторяет db.sqlite, из которой загружаются данные
+SCHEMA = """
+CREATE TABLE genre (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    created_at timestamp with time zone,
+    updated_at timestamp with time zone
+);
+CREATE TABLE film_work (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT,
+    creation_date DATE,
+    certificate TEXT,
+    file_path TEXT,
+    rating FLOAT,
+    type TEXT not null,
+    created_at timestamp with time zone,
+    updated_at timestamp with time zone
+);
+CREATE TABLE person (
+    id TEXT PRIMARY KEY,
+    full_name TEXT NOT NULL,
+    birth_date DATE,
+    created_at timestamp with time zone,
+    updated_at timestamp with time zone
+);
+CREATE TABLE genre_film_work (
+    id TEXT PRIMARY KEY,
+    film_work_id TEXT NOT NULL,
+    genre_id TEXT NOT NULL,
+    created_at timestamp with time zone
+);
+CREATE UNIQUE INDEX film_work_genre
+    ON genre_film_work (film_work_id, genre_id);
+CREATE TABLE person_film_work (
+    id TEXT PRIMARY KEY,
+    film_work_id TEXT NOT NULL,
+    person_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    created_at timestamp with time zone
+);
+CREATE UNIQUE INDEX film_work_person_role
+    ON person_film_work (film_work_id, person_id, role);
+"""
+
+# Соотношения из db.sqlite: на фильм в среднем 2.2 жанра,
+# 3.4 актера, 0.8 режиссера, 1.6 сценариста и 4.2 персоны в каталоге.
+# Равномерные диапазоны ROLES дают близкие средние: 3.5 актера,
+# 1 режиссер и 1.5 сценариста
+GENRES = 26
+PERSONS_PER_FILM = 4.2
+ROLES = (("actor", 1, 6), ("director", 0, 2), ("writer", 0, 3))
+WORDS = ("star", "night", "return", "empire", "lost", "city", "dark",
+         "love", "war", "king", "secret", "last", "time", "river", "game")
+BATCH = 10000
+
+
+def make_id(kind, number):
+    """Детерминированный uuid: повторная генерация дает те же id"""
+    digest = hashlib.md5(f"{kind}:{number}".encode()).digest()
+    return str(uuid.UUID(bytes=digest, version=4))
+
+
+class SyntheticDatabase(object):
+    def __init__(self, films, seed=0):
+        self.films = films
+        self.persons = max(1, int(films * PERSONS_PER_FILM))
+        self.random = random.Random(seed)
+        self.now = datetime(2021, 6, 16, tzinfo=timezone.utc)
+
+    def timestamp(self):
+        moment = self.now + timedelta(seconds=self.random.random() * 86400)
+        return moment.strftime("%Y-%m-%d %H:%M:%S.%f+00")
+
+    def text(self, words):
+        return " ".join(self.random.choice(WORDS) for _ in range(words))
+
+    def genre(self):
+        for number in range(GENRES):
+            created = self.timestamp()
+            yield (make_id("genre", number), f"Genre {number}",
+                   self.text(8), created, created)
+
+    def person(self):
+        for number in range(self.persons):
+            created = self.timestamp()
+            yield (make_id("person", number), f"Person {number}", None,
+                   created, created)
+
+    def film_work(self):
+        for number in range(self.films):
+            created = self.timestamp()
+            yield (make_id("film_work", number), self.text(3).title(),
+                   self.text(self.random.randint(0, 60)) or None, None,
+                   None, None, round(self.random.uniform(1, 10), 1),
+                   "movie", created, created)
+
+    def genre_film_work(self):
+        for number in range(self.films):
+            film_id = make_id("film_work", number)
+            for genre in self.random.sample(range(GENRES),
+                                            self.random.randint(1, 3)):
+                yield (make_id("genre_film_work", f"{number}:{genre}"),
+                       film_id, make_id("genre", genre), self.timestamp())
+
+    def person_film_work(self):
+        for number in range(self.films):
+            film_id = make_id("film_work", number)
+            for role, low, high in ROLES:
+                amount = min(self.random.randint(low, high), self.persons)
+                for person in self.random.sample(range(self.persons),
+                                                 amount):
+                    yield (make_id("person_film_work",
+                                   f"{number}:{person}:{role}"),
+                           film_id, make_id("person", person), role,
+                           self.timestamp())
+
+    def write(self, path):
+        with closing(sqlite3.connect(path)) as connection:
+            connection.executescript(SCHEMA)
+            for table in ("genre", "film_work", "person",
+                          "genre_film_work", "person_film_work"):
+                rows = getattr(self, table)()
+                while batch := list(islice(rows, BATCH)):
+                    placeholders = ",".join("?" * len(batch[0]))
+                    connection.executemany(
+                        f"INSERT INTO {table} VALUES ({placeholders})",
+                        batch)
+                connection.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic SQLite database for benchmarks")
+    parser.add_argument("path", help="Path to the new SQLite file")
+    parser.add_argument("--films", help="Number of film works",
+                        type=int, default=10000)
+    parser.add_argument("--seed", help="Random seed", type=int, default=0)
+    args = parser.parse_args()
+    SyntheticDatabase(args.films, args.seed).write(args.path)
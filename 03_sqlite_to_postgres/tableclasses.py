@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from datetime import date, datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class FilmWork:
     id: str
     title: str
@@ -16,7 +16,7 @@ class FilmWork:
     modified: datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class Genre:
     id: str
     name: str
@@ -25,7 +25,7 @@ class Genre:
     modified: datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class Person:
     id: str
     full_name: str
@@ -34,7 +34,7 @@ class Person:
     modified: datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class GenreFilmWork:
     id: str
     film_work_id: str
@@ -42,7 +42,7 @@ class GenreFilmWork:
     created: datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class PersonFilmWork:
     id: str
     film_work_id: str
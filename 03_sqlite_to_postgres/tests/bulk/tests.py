@@ -0,0 +1,81 @@
+import unittest
+
+from psycopg2 import sql
+
+from bulk import DeferredConstraints
+
+# Запуск из 03_sqlite_to_postgres: python -m unittest tests/bulk/tests.py
+
+CONSTRAINTS = [
+    ("content.genre_film_work", "genre_film_work_genre_id_fkey", "f",
+     "FOREIGN KEY (genre_id) REFERENCES content.genre(id)"),
+    ("genre_ref", "genre_ref_name_fkey", "f",
+     "FOREIGN KEY (name) REFERENCES content.genre(name)"),
+    ("content.genre", "genre_name_key", "u", "UNIQUE (name)"),
+]
+INDEXES = [
+    ("content.genre_modified_idx",
+     "CREATE INDEX genre_modified_idx ON content.genre USING btree "
+     "(modified)"),
+]
+
+
+def render(query):
+    """Текст запроса без соединения: sql.Composed собирается вручную"""
+    if isinstance(query, str):
+        return " ".join(query.split())
+    if isinstance(query, sql.Composed):
+        return "".join(render(part) for part in query.seq)
+    if isinstance(query, sql.Identifier):
+        return ".".join(f'"{name}"' for name in query.strings)
+    return query.string
+
+
+class RecordingCursor(object):
+    """Курсор, запоминающий запросы и возвращающий заданные строки"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append(render(query))
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+
+class DeferredConstraintsTest(unittest.TestCase):
+    """Порядок удаления и восстановления ограничений и индексов"""
+
+    def setUp(self):
+        self.cursor = RecordingCursor(CONSTRAINTS, INDEXES)
+        self.constraints = DeferredConstraints(self.cursor, ["genre"])
+        self.cursor.queries = []
+
+    def test_foreign_keys_dropped_before_unique_constraints(self):
+        self.constraints.drop()
+        self.assertEqual(self.cursor.queries, [
+            'ALTER TABLE content.genre_film_work '
+            'DROP CONSTRAINT "genre_film_work_genre_id_fkey"',
+            'ALTER TABLE genre_ref DROP CONSTRAINT "genre_ref_name_fkey"',
+            'ALTER TABLE content.genre DROP CONSTRAINT "genre_name_key"',
+            'DROP INDEX content.genre_modified_idx',
+        ])
+
+    def test_foreign_keys_restored_after_unique_constraints(self):
+        self.constraints.restore()
+        self.assertEqual(self.cursor.queries[1:], [
+            INDEXES[0][1],
+            'ALTER TABLE content.genre ADD CONSTRAINT "genre_name_key" '
+            'UNIQUE (name)',
+            'ALTER TABLE genre_ref ADD CONSTRAINT "genre_ref_name_fkey" '
+            'FOREIGN KEY (name) REFERENCES content.genre(name)',
+            'ALTER TABLE content.genre_film_work '
+            'ADD CONSTRAINT "genre_film_work_genre_id_fkey" '
+            'FOREIGN KEY (genre_id) REFERENCES content.genre(id)',
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
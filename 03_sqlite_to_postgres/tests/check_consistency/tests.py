@@ -1,137 +1,132 @@
+import hashlib
+import json
 import sqlite3
-from dataclasses import dataclass, field
-from datetime import date, datetime
 
 import psycopg2
 from psycopg2.extensions import connection as _connection
 from psycopg2.extras import DictCursor
 
+# Сравниваемые поля таблиц. Служебные created/modified и birth_date,
+# которого нет в PostgreSQL, не сравниваются.
+COMPARED_COLUMNS = {
+    "film_work": ("id", "title", "description", "creation_date",
+                  "certificate", "file_path", "rating", "type"),
+    "genre": ("id", "name", "description"),
+    "person": ("id", "full_name"),
+    "genre_film_work": ("id", "film_work_id", "genre_id"),
+    "person_film_work": ("id", "film_work_id", "person_id", "role"),
+}
+
+
+def normalize(row):
+    """Приведение значений к строкам: SQLite хранит даты и uuid как текст"""
+    return tuple(None if value is None else str(value) for value in row)
+
+
+def digest(rows):
+    return hashlib.sha1(repr(rows).encode()).hexdigest()
+
+
+def check_consistency(sqlite_con: sqlite3.Connection, pg_con: _connection,
+                      chunk_size: int = 10000):
+    """Сравнение таблиц SQLite и PostgreSQL по отсортированным по id блокам.
+
+    Блок SQLite из chunk_size записей задает диапазон id, в который
+    попадают и записи PostgreSQL, поэтому лишние записи тоже находятся.
+    Построчное сравнение выполняется только для блоков с разными хешами.
+    Возвращает отчет с отсутствующими, лишними и измененными id.
+    """
 
-def check_consistency(sqlite_con: sqlite3.Connection, pg_con: _connection):
-
-    @dataclass
-    class FilmWork:
-        id: str
-        title: str
-        description: str
-        creation_date: date
-        certificate: str
-        file_path: str
-        rating: float
-        type: str
-        created: datetime = field(compare=False)
-        modified: datetime = field(compare=False)
-
-    @dataclass
-    class Genre:
-        id: str
-        name: str
-        description: str
-        created: datetime = field(compare=False)
-        modified: datetime = field(compare=False)
-
-    @dataclass
-    class Person:
-        id: str
-        full_name: str
-        birth_date: date = field(compare=False, default=None)
-        created: datetime = field(compare=False, default=datetime.now())
-        modified: datetime = field(compare=False, default=datetime.now())
-
-    @dataclass
-    class GenreFilmWork:
-        id: str
-        film_work_id: str
-        genre_id: str
-        created: datetime = field(compare=False)
-
-    @dataclass
-    class PersonFilmWork:
-        id: str
-        film_work_id: str
-        person_id: str
-        role: str
-        created: datetime = field(compare=False)
-
-    tableclasses = {
-        "film_work": FilmWork,
-        "genre": Genre,
-        "person": Person,
-        "genre_film_work": GenreFilmWork,
-        "person_film_work": PersonFilmWork
-    }
-
-    sqlite_con.row_factory = sqlite3.Row
     sl_cur = sqlite_con.cursor()
     pg_cur = pg_con.cursor()
 
-    sl_tables = []
     sl_cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
     sl_tables = [table[0] for table in sl_cur.fetchall()]
 
-    pg_tables = []
     pg_cur.execute("""
                 SELECT table_name FROM information_schema.tables
                 WHERE table_schema = 'content'
                 """)
     pg_tables = [table[0] for table in pg_cur.fetchall()]
 
-    if set(sl_tables) == set(pg_tables):
+    report = {"tables_match": set(sl_tables) == set(pg_tables), "tables": {}}
+    if report["tables_match"]:
         print('Названия и количество таблиц совпадают.')
     else:
         print('Ошибка проверки количества и названий таблиц.')
 
-    def sl_records(table):
-        sl_cur.execute(f"SELECT * FROM {table}")
-        for row in sl_cur:
-            yield row
-
-    def get_pg_record(table, id):
-        try:
-            pg_cur.execute(f"SELECT * FROM content.{table} WHERE id='{id}'")
-            return pg_cur.fetchone()
-        except psycopg2.DatabaseError as error:
-            print("Ошибка при работе с PostgreSQL", error)
+    def sl_chunks(table, columns):
+        sql = (f"SELECT {columns} FROM {table} WHERE id > ? "
+               f"ORDER BY id LIMIT ?")
+        after = ""
+        while rows := sl_cur.execute(sql, (after, chunk_size)).fetchall():
+            yield [normalize(row) for row in rows]
+            after = rows[-1][0]
+
+    def pg_chunk(table, columns, after, last):
+        # id в диапазоне (after, last]; для последнего блока без границы
+        sql = f"SELECT {columns} FROM content.{table} WHERE TRUE"
+        params = []
+        if after is not None:
+            sql += " AND id > %s::uuid"
+            params.append(after)
+        if last is not None:
+            sql += " AND id <= %s::uuid"
+            params.append(last)
+        pg_cur.execute(sql + " ORDER BY id", params)
+        return [normalize(row) for row in pg_cur.fetchall()]
+
+    def compare_rows(sl_rows, pg_rows, result):
+        sl_by_id = {row[0]: row for row in sl_rows}
+        pg_by_id = {row[0]: row for row in pg_rows}
+        result["missing"].extend(id for id in sl_by_id if id not in pg_by_id)
+        result["extra"].extend(id for id in pg_by_id if id not in sl_by_id)
+        result["changed"].extend(id for id, row in sl_by_id.items()
+                                 if id in pg_by_id and pg_by_id[id] != row)
 
     for table in sl_tables:
+        if table not in COMPARED_COLUMNS or table not in pg_tables:
+            continue
         print(f"Таблица '{table}':")
-        sl_cur.execute(f"SELECT count(*) FROM {table}")
-        sl_count = sl_cur.fetchone()[0]
-
+        columns = COMPARED_COLUMNS[table]
+        result = {"missing": [], "extra": [], "changed": []}
         try:
-            pg_cur.execute(f"SELECT count(*) FROM content.{table}")
-            pg_count = pg_cur.fetchone()[0]
+            after = None
+            chunks = sl_chunks(table, ",".join(columns))
+            chunk = next(chunks, [])
+            while True:
+                following = next(chunks, None)
+                last = chunk[-1][0] if chunk and following else None
+                pg_rows = pg_chunk(
+                    table, "id::text," + ",".join(columns[1:]), after, last)
+                if digest(chunk) != digest(pg_rows):
+                    compare_rows(chunk, pg_rows, result)
+                if following is None:
+                    break
+                after, chunk = last, following
         except psycopg2.DatabaseError as error:
             print("Ошибка при работе с PostgreSQL", error)
-            break
-
-        if sl_count == pg_count:
-            print("-- Проверка целосности данных - ОК")
-            print("-- Проверка содержимого записей:")
-            record_error = False
-            for record in sl_records(table):
-                sl_record = tableclasses[table](*record)
-                try:
-                    pg_record = tableclasses[table](
-                        **get_pg_record(table, sl_record.id))
-                except Exception as error:
-                    print(f"Ошибка {error=}")
-                    break
-
-                if sl_record != pg_record:
-                    record_error = True
-                    print(f"---- Ошибка данных с id:'{sl_record.id}'"
-                          f" в таблице '{table}'")
-            if record_error is False:
-                print("---- Все записи из PostgreSQL присутствуют с такими же"
-                      "значениями полей, как и в SQLite")
+            pg_con.rollback()
+            result["error"] = str(error)
+
+        report["tables"][table] = result
+        if any(result.values()):
+            print(f"-- Ошибка: отсутствует {len(result['missing'])}, "
+                  f"лишних {len(result['extra'])}, "
+                  f"изменено {len(result['changed'])} записей")
         else:
-            print("-- Проверка целосности данных - Ошибка")
+            print("---- Все записи из PostgreSQL присутствуют с такими же"
+                  "значениями полей, как и в SQLite")
+    return report
 
 
 if __name__ == '__main__':
     sqlite_db = 'db.sqlite'
+    report_file = 'consistency_report.json'
     dsl = {'dbname': 'movies_database', 'user': 'app',
            'password': '123qwe', 'host': '127.0.0.1', 'port': 5432}
     with sqlite3.connect(sqlite_db) as sqlite_conn, psycopg2.connect(**dsl, cursor_factory=DictCursor) as pg_conn:
-        check_consistency(sqlite_conn, pg_conn)
+        report = check_consistency(sqlite_conn, pg_conn)
+    with open(report_file, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Отчет сохранен в {report_file}")
@@ -0,0 +1,66 @@
+import sqlite3
+import time
+import unittest
+
+from batcher import AdaptiveBatcher
+from pipeline import Pipeline
+from postgres_saver import PostgresSaver, Schema
+from sqlite_loader import SQLiteLoader
+
+# Запуск из 03_sqlite_to_postgres: python -m unittest tests/loader/tests.py
+
+
+class FakeConnection(object):
+    """Соединение Postgres для PostgresSaver без обращений к серверу"""
+
+    def cursor(self):
+        return None
+
+
+class AdaptiveBatcherPipelineTest(unittest.TestCase):
+    """Размер пакета при очереди между чтением и записью"""
+
+    row_latency = 0.00002  # время записи одной записи, секунд
+
+    def setUp(self):
+        self.connection = sqlite3.connect(":memory:",
+                                          check_same_thread=False)
+        self.connection.execute("CREATE TABLE genre (id TEXT, name TEXT)")
+        self.connection.executemany(
+            "INSERT INTO genre VALUES (?, ?)",
+            [(f"{number:05}", "genre") for number in range(20000)])
+
+    def tearDown(self):
+        self.connection.close()
+
+    def write(self, rows):
+        time.sleep(len(rows) * self.row_latency)
+
+    def test_size_follows_write_latency(self):
+        sqlite_loader = SQLiteLoader(
+            self.connection, packet_size=1000,
+            adaptive={"min_size": 10, "target_latency": 0.002})
+        postgres_saver = PostgresSaver(FakeConnection(), schema=Schema())
+        table = PostgresSaver.Table("genre", ["id", "name"], ["text", "text"])
+        batcher = sqlite_loader.batcher()
+        sizes = []
+
+        def writer(items):
+            for _, packet in items:
+                postgres_saver.write(self.write, table, packet,
+                                     batcher.observe)
+                sizes.append(len(packet))
+
+        # читатель быстрее писателя и ждет места в очереди
+        Pipeline(depth=4).run(
+            sqlite_loader.packets("genre", batcher=batcher), [writer])
+        self.assertEqual(sum(sizes), 20000)
+        # 0.002 с на пакет при 0.00002 с на запись - около 100 записей
+        self.assertIsInstance(batcher, AdaptiveBatcher)
+        self.assertGreaterEqual(batcher.size, 30)
+        self.assertLessEqual(batcher.size, 300)
+        self.assertLessEqual(max(sizes[-5:]), 300)
+
+
+if __name__ == "__main__":
+    unittest.main()
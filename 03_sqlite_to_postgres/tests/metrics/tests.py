@@ -0,0 +1,49 @@
+import os
+import pstats
+import tempfile
+import threading
+import unittest
+
+from metrics import Profiler
+
+# Запуск из 03_sqlite_to_postgres: python -m unittest tests/metrics/tests.py
+
+
+def load_packets():
+    return sum(number * number for number in range(10000))
+
+
+class ProfilerTest(unittest.TestCase):
+    """Статистика --profile по всем потокам загрузки"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "load.prof")
+
+    def test_stats_file_covers_threads(self):
+        profiler = Profiler(self.path)
+        profiler.start()
+        try:
+            # поток запускается после start, как писатели таблиц
+            thread = threading.Thread(target=load_packets)
+            thread.start()
+            thread.join()
+        finally:
+            profiler.stop()
+        stats = pstats.Stats(self.path)
+        self.assertIn("load_packets",
+                      [function for _, _, function in stats.stats])
+
+    def test_profiler_can_be_started_again(self):
+        # каждый профиль выключается в stop
+        for _ in range(2):
+            profiler = Profiler(self.path)
+            profiler.start()
+            load_packets()
+            profiler.stop()
+        self.assertTrue(pstats.Stats(self.path).stats)
+
+
+if __name__ == "__main__":
+    unittest.main()
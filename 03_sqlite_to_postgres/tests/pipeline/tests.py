@@ -0,0 +1,144 @@
+import threading
+import unittest
+
+from pipeline import Pipeline, Progress
+from postgres_saver import PostgresSaver, Schema
+
+# Запуск из 03_sqlite_to_postgres: python -m unittest tests/pipeline/tests.py
+
+
+class ProgressTest(unittest.TestCase):
+    """Контрольная точка при фиксации пакетов не по порядку"""
+
+    def test_checkpoint_waits_for_previous_packets(self):
+        progress = Progress()
+        self.assertIsNone(progress.commit([(1, "b"), (2, "c")]))
+        self.assertIsNone(progress.commit([(4, "e")]))
+        self.assertEqual(progress.commit([(0, "a")]), "c")
+        self.assertEqual(progress.commit([]), "c")
+        self.assertEqual(progress.commit([(3, "d")]), "e")
+
+    def test_checkpoint_never_passes_uncommitted_packet(self):
+        progress = Progress()
+        writers = [[(number, number) for number in range(start, 100, 3)]
+                   for start in range(3)]
+        # пакет 50 записан, но не зафиксирован
+        writers[50 % 3].remove((50, 50))
+        threads = [threading.Thread(target=progress.commit, args=(packets,))
+                   for packets in writers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(progress.last_id, 49)
+        self.assertEqual(progress.commit([(50, 50)]), 99)
+
+
+class RecordingConnection(object):
+    """Соединение Postgres, запоминающее зафиксированные пакеты"""
+
+    def __init__(self, log):
+        self.log = log
+        self.pending = []
+
+    def cursor(self):
+        return None
+
+    def commit(self):
+        self.log.committed.update(self.pending)
+        self.pending = []
+
+
+class RecordingCheckpoint(object):
+
+    def __init__(self, log):
+        self.log = log
+
+    def save(self, table, last_id, done=False):
+        # точка не должна опережать незафиксированные пакеты
+        self.log.checkpoints.append(
+            (last_id, set(range(last_id + 1)) <= self.log.committed))
+
+
+class SharedWriteLog(object):
+
+    def __init__(self):
+        self.committed = set()
+        self.checkpoints = []
+
+
+class SaveSharedTest(unittest.TestCase):
+    """Контрольная точка нескольких писателей одной таблицы"""
+
+    def test_checkpoint_covers_only_committed_packets(self):
+        log = SharedWriteLog()
+        table = PostgresSaver.Table("genre", ["id"], ["integer"])
+        savers = []
+        for _ in range(3):
+            saver = PostgresSaver(RecordingConnection(log), window=2,
+                                  schema=Schema())
+            saver.writer = lambda table, saver=saver: (
+                lambda rows: saver.connection.pending.extend(
+                    row[0] for row in rows))
+            savers.append(saver)
+        progress = Progress()
+        # пакет - одна запись, id которой равен номеру пакета
+        packets = ([(number,)] for number in range(60))
+        Pipeline(depth=4).run(packets, [
+            lambda items, saver=saver: saver.save_shared(
+                table, items, progress, RecordingCheckpoint(log))
+            for saver in savers])
+        self.assertEqual(log.committed, set(range(60)))
+        self.assertTrue(log.checkpoints)
+        self.assertTrue(all(covered for _, covered in log.checkpoints))
+        self.assertEqual(max(last_id for last_id, _ in log.checkpoints), 59)
+
+
+class PipelineTest(unittest.TestCase):
+    """Передача пакетов писателям и остановка при ошибке"""
+
+    def test_all_packets_written_once(self):
+        written = []
+        lock = threading.Lock()
+
+        def writer(items):
+            for number, packet in items:
+                with lock:
+                    written.append((number, packet))
+
+        Pipeline(depth=2).run(iter(range(100)), [writer, writer, writer])
+        self.assertEqual(sorted(written), list(enumerate(range(100))))
+
+    def test_reader_error_raised_from_run(self):
+        def packets():
+            yield 1
+            raise ValueError("broken source")
+
+        def writer(items):
+            for _ in items:
+                pass
+
+        with self.assertRaisesRegex(ValueError, "broken source"):
+            Pipeline(depth=2).run(packets(), [writer, writer])
+
+    def test_writer_error_stops_reader_and_other_writers(self):
+        def packets():
+            yield from range(1000)
+
+        def failing(items):
+            next(items)
+            raise RuntimeError("write failed")
+
+        def writer(items):
+            for _ in items:
+                pass
+
+        pipeline = Pipeline(depth=2)
+        with self.assertRaisesRegex(RuntimeError, "write failed"):
+            pipeline.run(packets(), [failing, writer])
+        self.assertTrue(pipeline.stop.is_set())
+        self.assertEqual(len(pipeline.errors), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,233 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from postgres_saver import Schema
+from tableclasses import FilmWork, PersonFilmWork
+from transform import DeadLetter, Transform, parse_datetime
+
+# Запуск из 03_sqlite_to_postgres: python -m unittest tests/transform/tests.py
+
+FILM_ID = "00af52ec-9345-4d66-adbe-50eb917f463a"
+PERSON_ID = "0031feab-8f53-412a-8f53-47098a60ac73"
+CREATED = "2021-06-16 20:14:09.706000+00"
+
+
+def film_work_row(id_=FILM_ID, **values):
+    row = {"id": id_, "title": "Star Wars", "description": None,
+           "creation_date": "1977-05-25", "certificate": None,
+           "file_path": None, "rating": 8.6, "type": "movie",
+           "created": CREATED, "modified": CREATED}
+    row.update(values)
+    return tuple(row.values())
+
+
+def person_film_work_row(id_, film_work_id=FILM_ID, person_id=PERSON_ID):
+    return (id_, film_work_id, person_id, "actor", CREATED)
+
+
+def make_schema():
+    """Схема content, как ее возвращает Schema.query"""
+    schema = Schema()
+    schema.load([
+        ("film_work", "id", "uuid", True, []),
+        ("film_work", "title", "character varying(255)", True, []),
+        ("film_work", "description", "text", False, []),
+        ("film_work", "creation_date", "date", False, []),
+        ("film_work", "certificate", "text", False, []),
+        ("film_work", "file_path", "text", False, []),
+        ("film_work", "rating", "double precision", False, []),
+        ("film_work", "type", "character varying(20)", True, []),
+        ("film_work", "created", "timestamp with time zone", False, []),
+        ("film_work", "modified", "timestamp with time zone", False, []),
+        ("person_film_work", "id", "uuid", True,
+         ["film_work", "person"]),
+        ("person_film_work", "film_work_id", "uuid", True,
+         ["film_work", "person"]),
+        ("person_film_work", "person_id", "uuid", True,
+         ["film_work", "person"]),
+        ("person_film_work", "role", "text", True, ["film_work", "person"]),
+        ("person_film_work", "created", "timestamp with time zone", False,
+         ["film_work", "person"]),
+    ])
+    return schema
+
+
+class RecordingCursor(object):
+    """Курсор Postgres, возвращающий заданные строки"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.params = []
+
+    def execute(self, query, params=None):
+        self.params.append(params)
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+
+class TransformTest(unittest.TestCase):
+    """Проверка записей пакета и файл отклоненных записей"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "rejected.ndjson")
+        self.dead_letter = DeadLetter(self.path)
+        self.addCleanup(self.dead_letter.close)
+        self.schema = make_schema()
+
+    def transform(self, name, tableclass, coerce=True):
+        return Transform(name, tableclass, self.schema, self.dead_letter,
+                         coerce=coerce)
+
+    def reopen(self):
+        """Файл отклоненных записей при дозагрузке"""
+        self.dead_letter.close()
+        self.dead_letter = DeadLetter(self.path, append=True)
+        self.addCleanup(self.dead_letter.close)
+
+    def rejected(self):
+        self.dead_letter.file.flush()
+        with open(self.path) as file:
+            return {record["id"]: record for record in map(json.loads, file)}
+
+    def test_valid_packet_is_coerced(self):
+        packet = self.transform("film_work", FilmWork).packet(
+            [film_work_row()])
+        self.assertEqual(len(packet), 1)
+        self.assertEqual(packet[0][3].isoformat(), "1977-05-25")
+        self.assertIsInstance(packet[0][8], datetime)
+        self.assertEqual(self.rejected(), {})
+
+    def test_parse_sqlite_timestamps(self):
+        # формат db.sqlite: смещение без минут
+        self.assertEqual(
+            parse_datetime("2021-06-16 20:14:09.221838+00"),
+            datetime(2021, 6, 16, 20, 14, 9, 221838, tzinfo=timezone.utc))
+        self.assertEqual(
+            parse_datetime("2021-06-16 20:14:09.70396+03"),
+            datetime(2021, 6, 16, 20, 14, 9, 703960,
+                     tzinfo=timezone(timedelta(hours=3))))
+        self.assertEqual(parse_datetime("2021-06-16T20:14:09Z"),
+                         datetime(2021, 6, 16, 20, 14, 9,
+                                  tzinfo=timezone.utc))
+        self.assertEqual(parse_datetime("2021-06-16 20:14"),
+                         datetime(2021, 6, 16, 20, 14))
+        with self.assertRaises(ValueError):
+            parse_datetime("yesterday")
+
+    def test_values_unchanged_without_coerce(self):
+        rows = [film_work_row()]
+        packet = self.transform("film_work", FilmWork, coerce=False).packet(
+            rows)
+        self.assertEqual(packet, rows)
+
+    def test_corrupted_rows_rejected(self):
+        corrupted = {
+            "00000000-0000-0000-0000-000000000001": {"rating": 500},
+            "00000000-0000-0000-0000-000000000002": {"type": "cartoon"},
+            "00000000-0000-0000-0000-000000000003": {"title": None},
+            "00000000-0000-0000-0000-000000000004": {
+                "creation_date": "25.05.1977"},
+            "00000000-0000-0000-0000-000000000005": {"modified": "yesterday"},
+            "00000000-0000-0000-0000-000000000006": {"title": "x" * 256},
+            "00000000-0000-0000-0000-000000000007": {"rating": "high"},
+        }
+        rows = [film_work_row()]
+        rows += [film_work_row(id_, **values)
+                 for id_, values in corrupted.items()]
+        rows.append(film_work_row("not-a-uuid"))
+        transform = self.transform("film_work", FilmWork)
+        packet = transform.packet(rows)
+        self.assertEqual([row[0] for row in packet], [FILM_ID])
+        self.assertEqual(transform.rejected, 8)
+        rejected = self.rejected()
+        for id_, values in corrupted.items():
+            self.assertEqual(set(rejected[id_]["errors"]), set(values))
+        self.assertEqual(rejected["not-a-uuid"]["errors"],
+                         {"id": "invalid uuid 'not-a-uuid'"})
+        # в файле сохраняется исходная запись
+        self.assertEqual(
+            rejected["00000000-0000-0000-0000-000000000001"]["record"][
+                "rating"], 500)
+
+    def test_rows_referencing_rejected_records_rejected(self):
+        bad_film = "00000000-0000-0000-0000-000000000001"
+        self.transform("film_work", FilmWork).packet(
+            [film_work_row(), film_work_row(bad_film, rating=-1)])
+        links = [
+            person_film_work_row("10000000-0000-0000-0000-000000000001"),
+            person_film_work_row("10000000-0000-0000-0000-000000000002",
+                                 film_work_id=bad_film),
+        ]
+        # Transform связей создается после загрузки таблиц, на которые
+        # они ссылаются, как в load_data
+        transform = self.transform("person_film_work", PersonFilmWork)
+        packet = transform.packet(links)
+        self.assertEqual([row[0] for row in packet], [links[0][0]])
+        self.assertEqual(
+            self.rejected()[links[1][0]]["errors"],
+            {"film_work_id": "references rejected film_work record"})
+
+    def test_rejected_ids_kept_when_appending(self):
+        bad_film = "00000000-0000-0000-0000-000000000001"
+        self.transform("film_work", FilmWork).packet(
+            [film_work_row(bad_film, rating=-1)])
+        self.reopen()
+        self.assertEqual(self.dead_letter.rejected,
+                         {"film_work": {bad_film}})
+        transform = self.transform("person_film_work", PersonFilmWork)
+        self.assertEqual(transform.packet([person_film_work_row(
+            "10000000-0000-0000-0000-000000000001",
+            film_work_id=bad_film)]), [])
+        self.assertEqual(len(self.rejected()), 2)
+
+    def test_accepted_records_no_longer_rejected(self):
+        bad_film = "00000000-0000-0000-0000-000000000001"
+        self.transform("film_work", FilmWork).packet(
+            [film_work_row(bad_film, rating=-1)])
+        self.reopen()
+        # запись исправлена в SQLite и загружена повторно
+        self.transform("film_work", FilmWork).packet(
+            [film_work_row(bad_film)])
+        self.assertEqual(self.dead_letter.rejected, {"film_work": set()})
+        link = person_film_work_row("10000000-0000-0000-0000-000000000001",
+                                    film_work_id=bad_film)
+        packet = self.transform("person_film_work", PersonFilmWork).packet(
+            [link])
+        self.assertEqual([row[0] for row in packet], [link[0]])
+        # принятие сохраняется в файле для следующей дозагрузки
+        self.reopen()
+        self.assertEqual(self.dead_letter.rejected, {"film_work": set()})
+
+    def test_references_to_records_in_postgres_accepted(self):
+        bad_film = "00000000-0000-0000-0000-000000000001"
+        self.transform("film_work", FilmWork).packet(
+            [film_work_row(bad_film, rating=-1),
+             film_work_row("not-a-uuid")])
+        self.reopen()
+        # прежняя версия записи уже есть в Postgres
+        cursor = RecordingCursor([(bad_film,)])
+        self.dead_letter.reconcile(cursor, ["film_work", "person"])
+        self.assertEqual(cursor.params, [([bad_film],)])
+        self.assertEqual(self.dead_letter.rejected,
+                         {"film_work": {"not-a-uuid"}})
+        link = person_film_work_row("10000000-0000-0000-0000-000000000001",
+                                    film_work_id=bad_film)
+        packet = self.transform("person_film_work", PersonFilmWork).packet(
+            [link])
+        self.assertEqual([row[0] for row in packet], [link[0]])
+
+    def test_empty_packets_skipped(self):
+        transform = self.transform("film_work", FilmWork)
+        packets = list(transform.packets(
+            [[film_work_row(rating=500)], [film_work_row()]]))
+        self.assertEqual(len(packets), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
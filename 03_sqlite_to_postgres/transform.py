@@ -0,0 +1,297 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import fields
+from datetime import date, datetime
+
+UUID = re.compile(r"[0-9a-fA-F]{8}(-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}")
+VARCHAR = re.compile(r"character varying\((\d+)\)")
+
+# Смещение без минут после времени и дробная часть секунд
+OFFSET = re.compile(r"(\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?[+-]\d{2})$")
+FRACTION = re.compile(r"\.(\d+)")
+
+
+def fraction(match):
+    return "." + match[1][:6].ljust(6, "0")
+
+
+def parse_datetime(value):
+    """datetime.fromisoformat для текста timestamptz из SQLite.
+
+    До Python 3.11 fromisoformat не разбирает смещение без минут (+00,
+    как в db.sqlite), Z и дробную часть не из 3 или 6 цифр, поэтому
+    значение сначала приводится к полному формату.
+    """
+    value = OFFSET.sub(r"\1:00", value.replace("Z", "+00:00"))
+    return datetime.fromisoformat(FRACTION.sub(fraction, value))
+
+
+# Приведение текста SQLite к типам полей tableclasses
+PARSERS = {
+    date: date.fromisoformat,
+    datetime: (datetime.fromisoformat if sys.version_info >= (3, 11)
+               else parse_datetime),
+    float: float,
+}
+
+# Ограничения моделей Django, которых нет в схеме Postgres
+RANGES = {("film_work", "rating"): (0, 100)}
+CHOICES = {("film_work", "type"): ("movie", "tv_show")}
+
+
+def check_uuid(value):
+    if not UUID.fullmatch(value):
+        raise ValueError(f"invalid uuid {value!r}")
+    return value
+
+
+def check_range(low, high):
+    def check(value):
+        if not low <= value <= high:
+            raise ValueError(f"{value} is out of range [{low}, {high}]")
+        return value
+    return check
+
+
+def check_choices(choices):
+    def check(value):
+        if value not in choices:
+            raise ValueError(f"{value!r} is not one of {choices}")
+        return value
+    return check
+
+
+def check_length(length):
+    def check(value):
+        if len(value) > length:
+            raise ValueError(f"longer than {length} characters")
+        return value
+    return check
+
+
+def check_reference(table, rejected):
+    def check(value):
+        if value in rejected:
+            raise ValueError(f"references rejected {table} record")
+        return value
+    return check
+
+
+def chain(steps):
+    if len(steps) == 1:
+        return steps[0]
+
+    def convert(value):
+        for step in steps:
+            value = step(value)
+        return value
+    return convert
+
+
+def convert_column(values, convert, nullable):
+    """Приведенные значения колонки и {номер записи: причина отказа}.
+
+    Сначала вся колонка приводится одним map; по значениям с разбором
+    ошибок она проходится, только если в ней есть NULL или ошибка.
+    convert=None - только проверка NULL.
+    """
+    if None not in values:
+        if convert is None:
+            return values, {}
+        try:
+            return list(map(convert, values)), {}
+        except (TypeError, ValueError):
+            pass
+    converted = []
+    errors = {}
+    for number, value in enumerate(values):
+        if value is None:
+            if not nullable:
+                errors[number] = "null value"
+        elif convert is not None:
+            try:
+                value = convert(value)
+            except (TypeError, ValueError) as error:
+                errors[number] = str(error)
+        converted.append(value)
+    return converted, errors
+
+
+class DeadLetter(object):
+    """Файл NDJSON с отклоненными записями и причинами отказа.
+
+    Запоминает id отклоненных записей, чтобы отклонять и записи,
+    которые на них ссылаются. При дозагрузке файл дополняется, и id
+    из него тоже учитываются, пока запись не будет принята позже:
+    тогда в файл добавляется строка с "accepted" и id снимается.
+
+    Контрольная точка проходит мимо отклоненных записей, и --resume
+    и --incremental их не повторяют. Чтобы загрузить их снова, записи
+    исправляются в SQLite и загрузка запускается с --since раньше их
+    modified (created у связей), который сохранен в поле "record".
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.rejected = {}
+        self._lock = threading.Lock()
+        if append and os.path.exists(path):
+            with open(path) as file:
+                for line in file:
+                    record = json.loads(line)
+                    ids = self.rejected.setdefault(record["table"], set())
+                    if record.get("accepted"):
+                        ids.discard(record["id"])
+                    else:
+                        ids.add(record["id"])
+        self.file = open(path, "a" if append else "w")
+
+    def write(self, table, records):
+        """Запись отклоненных записей [(запись, {поле: причина}), ...]"""
+        with self._lock:
+            ids = self.rejected.setdefault(table, set())
+            for record, errors in records:
+                ids.add(record["id"])
+                self.file.write(json.dumps(
+                    {"table": table, "id": record["id"], "errors": errors,
+                     "record": record},
+                    ensure_ascii=False, default=str) + "\n")
+            self.file.flush()
+
+    def accept(self, table, ids):
+        """Снятие отказа с записей, принятых при повторной загрузке"""
+        with self._lock:
+            rejected = self.rejected.get(table, set())
+            accepted = rejected.intersection(ids)
+            if not accepted:
+                return
+            rejected.difference_update(accepted)
+            for id_ in accepted:
+                self.file.write(json.dumps(
+                    {"table": table, "id": id_, "accepted": True}) + "\n")
+            self.file.flush()
+
+    def reconcile(self, cursor, tables):
+        """Снятие отказа с записей таблиц, которые уже есть в Postgres.
+
+        Запись могла быть загружена прежде, чем ее отклонили, или
+        исправлена и загружена иначе: ссылки на нее не нарушают
+        внешних ключей, и отклонять их незачем.
+        """
+        for table in tables:
+            ids = [id_ for id_ in self.rejected.get(table, ())
+                   if UUID.fullmatch(id_)]
+            if not ids:
+                continue
+            cursor.execute(f"SELECT id::text FROM content.{table} "
+                           f"WHERE id = ANY(%s::uuid[])", (ids,))
+            self.accept(table, [row[0] for row in cursor.fetchall()])
+
+    def close(self):
+        self.file.close()
+
+
+class Transform(object):
+    """Проверка и приведение записей пакета по колонкам.
+
+    Пакет транспонируется, каждая колонка проверяется и приводится
+    к типу поля tableclass за один проход, и записи собираются обратно.
+    Проверяются NOT NULL, uuid, длина varchar, диапазон и допустимые
+    значения из моделей, ссылки на отклоненные записи. Записи с
+    ошибками уходят в DeadLetter и не прерывают загрузку.
+
+    С coerce=False значения только проверяются, а в пакете остаются
+    исходными: текстовый COPY и INSERT передают их серверу строками,
+    и приведение к типам Python там только замедлило бы запись.
+    """
+
+    def __init__(self, name, tableclass, schema, dead_letter, coerce=True,
+                 metrics=None):
+        self.name = name
+        self.dead_letter = dead_letter
+        self.coerce = coerce
+        self.metrics = metrics
+        self.fields = [field.name for field in fields(tableclass)]
+        self.rejected = 0
+        types = dict(zip(schema.columns[name], schema.types[name]))
+        # (позиция поля, функция приведения, допускается ли NULL)
+        self.columns = []
+        for position, field in enumerate(fields(tableclass)):
+            type_ = types.get(field.name)
+            if type_ is None:
+                # поле не записывается в Postgres
+                continue
+            steps = self.steps(field, type_, schema.references[name])
+            nullable = field.name not in schema.notnull[name]
+            if steps or not nullable:
+                self.columns.append(
+                    (position, chain(steps) if steps else None, nullable))
+
+    def steps(self, field, type_, references):
+        steps = []
+        if field.type in PARSERS:
+            steps.append(PARSERS[field.type])
+        if type_ == "uuid":
+            steps.append(check_uuid)
+        if length := VARCHAR.fullmatch(type_):
+            steps.append(check_length(int(length[1])))
+        if (self.name, field.name) in RANGES:
+            steps.append(check_range(*RANGES[self.name, field.name]))
+        if (self.name, field.name) in CHOICES:
+            steps.append(check_choices(CHOICES[self.name, field.name]))
+        for table in references:
+            rejected = self.dead_letter.rejected.get(table)
+            if field.name == f"{table}_id" and rejected:
+                steps.append(check_reference(table, rejected))
+        return steps
+
+    def packet(self, rows):
+        """Записи пакета без отклоненных, приведенные при coerce"""
+        if not self.metrics:
+            return self.convert(rows)
+        started = time.perf_counter()
+        packet = self.convert(rows)
+        self.metrics.add(self.name, "transform",
+                         time.perf_counter() - started, packet)
+        return packet
+
+    def convert(self, rows):
+        if not self.columns:
+            return rows
+        values = list(zip(*rows))
+        errors = {}
+        for position, convert, nullable in self.columns:
+            converted, bad = convert_column(
+                values[position], convert, nullable)
+            if self.coerce:
+                values[position] = converted
+            for number, reason in bad.items():
+                errors.setdefault(number, {})[
+                    self.fields[position]] = reason
+        packet = list(zip(*values)) if self.coerce else rows
+        if self.dead_letter.rejected.get(self.name):
+            # исправленные записи, отклоненные при прошлой загрузке
+            self.dead_letter.accept(self.name, [
+                row[0] for number, row in enumerate(rows)
+                if number not in errors])
+        if not errors:
+            return packet
+        self.reject(rows, errors)
+        return [row for number, row in enumerate(packet)
+                if number not in errors]
+
+    def reject(self, rows, errors):
+        self.rejected += len(errors)
+        self.dead_letter.write(self.name, [
+            (dict(zip(self.fields, rows[number])), reasons)
+            for number, reasons in errors.items()])
+
+    def packets(self, packets):
+        """Генератор приведенных пакетов; пустые пакеты пропускаются"""
+        for packet in packets:
+            if rows := self.packet(packet):
+                yield rows